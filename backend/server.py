@@ -1,23 +1,41 @@
-from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, HTTPException
-from fastapi.responses import StreamingResponse, FileResponse
+import time
+STARTUP_STARTED_AT = time.monotonic()  # taken before the imports below so they count towards startup time
+
+from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
 import logging
 import asyncio
 import subprocess
+import signal
 import json
 import sqlite3
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, TYPE_CHECKING
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import tempfile
 import shutil
+import contextlib
+import csv
+import io
+import zlib
+import gzip
+import re
+import math
+import importlib
+import importlib.util
 import databases
 import sqlalchemy
 
+# pandas/NumPy (analytics) and pyarrow (Parquet export) are imported on first use
+# and pre-warmed in the background, so they do not slow down process startup.
+if TYPE_CHECKING:
+    import pandas as pd
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -41,6 +59,14 @@ scan_sessions_table = sqlalchemy.Table(
     sqlalchemy.Column("output_file", sqlalchemy.String, nullable=True),
     sqlalchemy.Column("error_message", sqlalchemy.String, nullable=True),
     sqlalchemy.Column("promptmap_directory", sqlalchemy.String, nullable=True),
+    sqlalchemy.Column("worker_id", sqlalchemy.String, nullable=True),  # API worker that owns the scan
+    sqlalchemy.Column("heartbeat_at", sqlalchemy.DateTime, nullable=True),
+    sqlalchemy.Column("client_name", sqlalchemy.String, nullable=True),
+    sqlalchemy.Column("estimated_work", sqlalchemy.Float, nullable=True),
+    sqlalchemy.Column("log_archive", sqlalchemy.String, nullable=True),  # compressed output log once archived
+    sqlalchemy.Column("archived_at", sqlalchemy.DateTime, nullable=True),
+    sqlalchemy.Column("alias_of", sqlalchemy.String, nullable=True),  # primary session an identical request attached to
+    sqlalchemy.Column("detached_at", sqlalchemy.DateTime, nullable=True),  # primary's requester cancelled while others were attached
 )
 
 status_checks_table = sqlalchemy.Table(
@@ -51,8 +77,115 @@ status_checks_table = sqlalchemy.Table(
     sqlalchemy.Column("timestamp", sqlalchemy.DateTime),
 )
 
-engine = sqlalchemy.create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-metadata.create_all(engine)
+scan_results_table = sqlalchemy.Table(
+    "scan_results",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, autoincrement=True),
+    sqlalchemy.Column("session_id", sqlalchemy.String, index=True),
+    sqlalchemy.Column("probe", sqlalchemy.String),
+    sqlalchemy.Column("detector", sqlalchemy.String),
+    sqlalchemy.Column("passed", sqlalchemy.Integer),
+    sqlalchemy.Column("total", sqlalchemy.Integer),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime),
+)
+
+scan_events_table = sqlalchemy.Table(
+    "scan_events",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, autoincrement=True),
+    sqlalchemy.Column("session_id", sqlalchemy.String, index=True),
+    sqlalchemy.Column("kind", sqlalchemy.String),  # output, end, detach or command
+    sqlalchemy.Column("payload", sqlalchemy.Text),
+    sqlalchemy.Column("worker_id", sqlalchemy.String),
+    sqlalchemy.Column("created_at", sqlalchemy.DateTime),
+    # Followers poll for ids above their cursor, so ids freed by archival must never be reused
+    sqlite_autoincrement=True,
+)
+
+scan_spans_table = sqlalchemy.Table(
+    "scan_spans",
+    metadata,
+    sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True, autoincrement=True),
+    sqlalchemy.Column("session_id", sqlalchemy.String, index=True),
+    sqlalchemy.Column("name", sqlalchemy.String),
+    sqlalchemy.Column("track", sqlalchemy.String),  # scan, subprocess, probes, database or websocket
+    sqlalchemy.Column("phase", sqlalchemy.String),  # Chrome trace phase: X (complete) or i (instant)
+    sqlalchemy.Column("ts", sqlalchemy.BigInteger),  # microseconds since the epoch
+    sqlalchemy.Column("dur", sqlalchemy.BigInteger),
+    sqlalchemy.Column("pid", sqlalchemy.Integer),
+    sqlalchemy.Column("worker_id", sqlalchemy.String),
+    sqlalchemy.Column("args", sqlalchemy.Text),  # JSON
+)
+
+maintenance_leases_table = sqlalchemy.Table(
+    "maintenance_leases",
+    metadata,
+    sqlalchemy.Column("name", sqlalchemy.String, primary_key=True),
+    sqlalchemy.Column("worker_id", sqlalchemy.String),
+    sqlalchemy.Column("expires_at", sqlalchemy.DateTime),
+    sqlalchemy.Column("finished_at", sqlalchemy.DateTime, nullable=True),
+)
+
+def rebuild_scan_events(connection):
+    """Recreate a scan_events table from before AUTOINCREMENT, keeping its rows and ids"""
+    connection.exec_driver_sql("ALTER TABLE scan_events RENAME TO scan_events_legacy")
+    for index in scan_events_table.indexes:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    scan_events_table.create(connection)
+    columns = ", ".join(column.name for column in scan_events_table.columns)
+    connection.exec_driver_sql(f"INSERT INTO scan_events ({columns}) SELECT {columns} FROM scan_events_legacy")
+    connection.exec_driver_sql("DROP TABLE scan_events_legacy")
+
+def migrate_schema(attempts: int = 5):
+    """Create missing tables and add columns introduced after the database file was created"""
+    engine = sqlalchemy.create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    for attempt in range(attempts):
+        try:
+            with engine.connect() as connection:
+                # Only takes effect on a new, empty file; existing files need POST /api/maintenance/run?rebuild=true
+                connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            metadata.create_all(engine)
+            inspector = sqlalchemy.inspect(engine)
+            with engine.begin() as connection:
+                for table in metadata.sorted_tables:
+                    existing = {column["name"] for column in inspector.get_columns(table.name)}
+                    for column in table.columns:
+                        if column.name not in existing:
+                            column_type = column.type.compile(engine.dialect)
+                            connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            with engine.begin() as connection:
+                table_sql = connection.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'scan_events'"
+                ).scalar()
+                if "AUTOINCREMENT" not in table_sql.upper():
+                    rebuild_scan_events(connection)
+            # WAL lets every API worker read the event log while one of them writes
+            with engine.connect() as connection:
+                connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+            return
+        except sqlalchemy.exc.OperationalError:
+            # Another worker is migrating the same file; retry against its result
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.2)
+        finally:
+            engine.dispose()
+
+@contextlib.asynccontextmanager
+async def immediate_transaction():
+    """Run the enclosed queries in one transaction that takes SQLite's write lock up front
+
+    Queries issued through ``database`` from the same task share the connection, so a
+    check-then-insert inside this block is atomic across API workers.
+    """
+    async with database.connection() as connection:
+        await connection.raw_connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            await connection.raw_connection.execute("ROLLBACK")
+            raise
+        await connection.raw_connection.execute("COMMIT")
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -81,6 +214,358 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# Tracing
+# Spans are buffered per worker and written in batches; GET /api/scan/{id}/trace
+# exports them as Chrome trace events (chrome://tracing or ui.perfetto.dev).
+TRACE_TRACKS = {"scan": 1, "subprocess": 2, "probes": 3, "database": 4, "websocket": 5}
+TRACE_FLUSH_INTERVAL = 1.0
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+class Span:
+    """An open span; callers may add to ``args`` before it ends"""
+    def __init__(self, session_id: str, name: str, track: str, args: Dict):
+        self.session_id = session_id
+        self.name = name
+        self.track = track
+        self.args = args
+        self.start_us = now_us()
+
+class Tracer:
+    """Records timing spans per scan session"""
+    def __init__(self):
+        self.pending: List[Dict] = []
+        self.open_spans: Dict[str, List[Span]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def record(self, session_id: str, name: str, track: str, phase: str, ts: int, dur: int, args: Optional[Dict] = None):
+        self.pending.append({
+            "session_id": session_id,
+            "name": name,
+            "track": track,
+            "phase": phase,
+            "ts": ts,
+            "dur": dur,
+            "pid": os.getpid(),
+            "worker_id": WORKER_ID,
+            "args": json.dumps(args or {}, default=str),
+        })
+
+    def start(self, session_id: str, name: str, track: str = "scan", **args) -> Span:
+        span = Span(session_id, name, track, args)
+        self.open_spans.setdefault(session_id, []).append(span)
+        return span
+
+    def end(self, span: Span, **args):
+        spans = self.open_spans.get(span.session_id, [])
+        if span not in spans:
+            return
+        spans.remove(span)
+        if not spans:
+            self.open_spans.pop(span.session_id, None)
+        span.args.update(args)
+        self.record(span.session_id, span.name, span.track, "X", span.start_us, now_us() - span.start_us, span.args)
+
+    @contextlib.contextmanager
+    def span(self, session_id: str, name: str, track: str = "scan", **args):
+        span = self.start(session_id, name, track, **args)
+        try:
+            yield span
+        finally:
+            self.end(span)
+
+    def instant(self, session_id: str, name: str, track: str = "scan", **args):
+        self.record(session_id, name, track, "i", now_us(), 0, args)
+
+    def close_session(self, session_id: str):
+        """End spans left open by a scan that was cancelled or failed"""
+        for span in list(self.open_spans.get(session_id, [])):
+            if span.track != "websocket":
+                self.end(span, unfinished=True)
+
+    async def flush(self):
+        if not self.pending:
+            return
+        spans, self.pending = self.pending, []
+        await database.execute_many(scan_spans_table.insert(), spans)
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(TRACE_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Error writing trace spans: {e}")
+
+    def start_flushing(self):
+        self.task = asyncio.create_task(self.flush_loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.flush()
+
+tracer = Tracer()
+
+class ProbeTracker:
+    """Derives garak stage and probe spans from its console output"""
+    PROBE_RE = re.compile(r'probes\.(?P<probe>\w+\.\w+)')
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.current: Optional[Span] = None
+        self.current_name: Optional[str] = None
+        self.switch("garak.startup", "stage")
+
+    def switch(self, name: str, kind: str, **args):
+        if self.current:
+            tracer.end(self.current)
+        self.current = tracer.start(self.session_id, name, "probes", kind=kind, **args)
+        self.current_name = name
+
+    def feed(self, line: str, result: Optional[Dict] = None):
+        if result:
+            tracer.instant(self.session_id, f"result {result['probe']}", "probes", **result)
+            return
+        if "loading generator" in line and self.current_name == "garak.startup":
+            self.switch("garak.load_generator", "stage")
+            return
+        match = self.PROBE_RE.search(line)
+        if match and self.current_name != f"probe {match.group('probe')}":
+            self.switch(f"probe {match.group('probe')}", "probe", probe=match.group("probe"))
+
+    def close(self):
+        if self.current:
+            tracer.end(self.current)
+            self.current = None
+
+# Cross-worker event bus
+# Every API worker shares the scan_events table. The worker that claims a session runs
+# its scan and appends output to the log; any worker can follow the log for a WebSocket
+# client, and control commands reach the owner through the same log.
+WORKER_ID = f"{os.uname().nodename if hasattr(os, 'uname') else 'local'}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+EVENT_FLUSH_INTERVAL = 0.05
+EVENT_POLL_INTERVAL = 0.2
+EVENT_BATCH_SIZE = 500
+EVENT_MAX_PENDING = 1000
+HEARTBEAT_INTERVAL = 5.0
+HEARTBEAT_TIMEOUT = 30.0
+SCAN_TERMINATE_GRACE = 5.0
+
+running_scans: Dict[str, asyncio.Task] = {}
+scan_processes: Dict[str, asyncio.subprocess.Process] = {}
+
+def signal_scan_process(process: asyncio.subprocess.Process, sig: int):
+    """Signal a scan's whole process group, so the tool started by `conda run` is reached too"""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, sig)
+        elif sig == signal.SIGTERM:
+            process.terminate()
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+async def stop_scan_process(process: asyncio.subprocess.Process):
+    """Terminate a scan's process group, killing whatever outlives the grace period"""
+    signal_scan_process(process, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), SCAN_TERMINATE_GRACE)
+    except asyncio.TimeoutError:
+        pass
+    signal_scan_process(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+class Subscription:
+    """A follower of one session's event log, catching up from the database when behind"""
+    def __init__(self, bus, session_id: str, after_id: int = 0):
+        self.bus = bus
+        self.session_id = session_id
+        self.last_id = after_id
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.lagging = True
+
+    def deliver(self, event: Dict):
+        if self.lagging or event["id"] <= self.last_id:
+            return
+        if self.queue.qsize() >= EVENT_BATCH_SIZE:
+            # Slow consumer: stop buffering and re-read from the log once drained
+            self.lagging = True
+            return
+        self.queue.put_nowait(event)
+        self.last_id = event["id"]
+
+    async def catch_up(self):
+        generation = self.bus.generation
+        query = scan_events_table.select().where(
+            scan_events_table.c.session_id == self.session_id,
+            scan_events_table.c.id > self.last_id
+        ).order_by(scan_events_table.c.id).limit(EVENT_BATCH_SIZE)
+        rows = await database.fetch_all(query)
+        for row in rows:
+            self.queue.put_nowait(dict(row))
+            self.last_id = row["id"]
+        # Only go live if the dispatcher skipped nothing while the page was being read
+        if len(rows) < EVENT_BATCH_SIZE and generation == self.bus.generation:
+            self.lagging = False
+
+    def drain(self) -> List[Dict]:
+        """Return the events already buffered without waiting"""
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    async def get(self) -> Dict:
+        while self.queue.empty() and self.lagging:
+            await self.catch_up()
+            if self.queue.empty() and self.lagging:
+                await asyncio.sleep(0)
+        return await self.queue.get()
+
+class EventBus:
+    """SQLite-backed event log shared by all API worker processes"""
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.pending: List[Dict] = []
+        self.subscriptions: Dict[str, List[Subscription]] = {}
+        self.cursor = 0
+        self.generation = 0
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        row = await database.fetch_one(sqlalchemy.select(sqlalchemy.func.max(scan_events_table.c.id)))
+        self.cursor = row[0] or 0
+        self.tasks = [
+            asyncio.create_task(self.flush_loop()),
+            asyncio.create_task(self.poll_loop()),
+            asyncio.create_task(self.heartbeat_loop()),
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.flush()
+
+    async def publish(self, session_id: str, payload: str, kind: str = "output"):
+        """Queue an event for the shared log; writes are batched"""
+        self.pending.append({
+            "session_id": session_id,
+            "kind": kind,
+            "payload": payload,
+            "worker_id": self.worker_id,
+            "created_at": datetime.utcnow(),
+        })
+        if len(self.pending) >= EVENT_MAX_PENDING or kind != "output":
+            await self.flush()
+
+    async def flush(self):
+        async with self.flush_lock:
+            if not self.pending:
+                return
+            events, self.pending = self.pending, []
+            started = now_us()
+            await database.execute_many(scan_events_table.insert(), events)
+            duration = now_us() - started
+        counts: Dict[str, int] = {}
+        for event in events:
+            counts[event["session_id"]] = counts.get(event["session_id"], 0) + 1
+        for session_id, count in counts.items():
+            tracer.record(session_id, "db.insert scan_events", "database", "X", started, duration, {"events": count})
+        self.wakeup.set()
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(EVENT_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Error flushing scan events: {e}")
+
+    def subscribe(self, session_id: str, after_id: int = 0) -> Subscription:
+        subscription = Subscription(self, session_id, after_id)
+        self.subscriptions.setdefault(session_id, []).append(subscription)
+        self.wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self.subscriptions.get(subscription.session_id, [])
+        if subscription in subscriptions:
+            subscriptions.remove(subscription)
+        if not subscriptions:
+            self.subscriptions.pop(subscription.session_id, None)
+
+    async def poll(self) -> int:
+        session_ids = set(self.subscriptions) | set(running_scans)
+        if not session_ids:
+            return 0
+        query = scan_events_table.select().where(
+            scan_events_table.c.id > self.cursor,
+            scan_events_table.c.session_id.in_(session_ids)
+        ).order_by(scan_events_table.c.id).limit(EVENT_BATCH_SIZE)
+        rows = await database.fetch_all(query)
+        for row in rows:
+            event = dict(row)
+            self.cursor = event["id"]
+            if event["kind"] == "command":
+                if event["session_id"] in running_scans:
+                    await handle_scan_command(event["session_id"], event["payload"])
+                continue
+            for subscription in list(self.subscriptions.get(event["session_id"], [])):
+                subscription.deliver(event)
+        if rows:
+            self.generation += 1
+        return len(rows)
+
+    async def poll_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=EVENT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                while await self.poll() == EVENT_BATCH_SIZE:
+                    pass
+            except Exception as e:
+                logging.error(f"Error polling scan events: {e}")
+
+    async def heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                if running_scans:
+                    query = scan_sessions_table.update().where(
+                        scan_sessions_table.c.id.in_(list(running_scans))
+                    ).values(heartbeat_at=datetime.utcnow())
+                    await database.execute(query)
+                await reap_stale_scans()
+            except Exception as e:
+                logging.error(f"Error updating scan heartbeats: {e}")
+
+bus = EventBus(WORKER_ID)
+
+async def handle_scan_command(session_id: str, command: str):
+    """Apply a control command to a scan owned by this worker"""
+    if command == "cancel":
+        # Requests that attached after the cancel was sent keep the scan running
+        if await detach_primary(session_id):
+            return
+        await bus.publish(session_id, "🛑 Cancelling scan...")
+        process = scan_processes.get(session_id)
+        if process and process.returncode is None:
+            signal_scan_process(process, signal.SIGTERM)
+        task = running_scans.get(session_id)
+        if task:
+            task.cancel()
+
 # Define Models
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -96,6 +581,8 @@ class ScanRequest(BaseModel):
     probes: List[str]
     tool: str = "garak"  # garak or promptmap
     promptmap_directory: Optional[str] = None  # Required when tool is promptmap
+    client_name: Optional[str] = None  # Used for per-client admission quotas
+    dedupe: bool = True  # Attach to an identical pending or running scan instead of starting another
 
 class ScanSession(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -109,10 +596,85 @@ class ScanSession(BaseModel):
     output_file: Optional[str] = None
     error_message: Optional[str] = None
     promptmap_directory: Optional[str] = None
+    client_name: Optional[str] = None
+    estimated_work: float = 1.0
+    alias_of: Optional[str] = None
+
+# Startup and readiness
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "5"))
+DISCOVERY_CACHE_TTL = float(os.environ.get("DISCOVERY_CACHE_TTL", "300"))
+
+class Readiness:
+    """Tracks which subsystems have finished initializing"""
+    def __init__(self, required: List[str], optional: List[str]):
+        self.required = required
+        self.subsystems: Dict[str, str] = {name: "starting" for name in required + optional}
+        self.errors: Dict[str, str] = {}
+        self.ready_at: Optional[float] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return all(self.subsystems[name] == "ready" for name in self.required)
+
+    def mark_ready(self, name: str):
+        self.subsystems[name] = "ready"
+        if self.ready_at is None and self.is_ready:
+            self.ready_at = time.monotonic()
+            elapsed = self.ready_at - STARTUP_STARTED_AT
+            if elapsed > STARTUP_BUDGET_SECONDS:
+                logging.warning(f"Startup took {elapsed:.2f}s, over the {STARTUP_BUDGET_SECONDS:.2f}s budget")
+            else:
+                logging.info(f"Startup took {elapsed:.2f}s (budget {STARTUP_BUDGET_SECONDS:.2f}s)")
+
+    def mark_failed(self, name: str, error: str):
+        self.subsystems[name] = "failed"
+        self.errors[name] = error
+        logging.error(f"Subsystem {name} failed to start: {error}")
+
+    def report(self) -> Dict:
+        startup_seconds = (self.ready_at or time.monotonic()) - STARTUP_STARTED_AT
+        return {
+            "ready": self.is_ready,
+            "subsystems": self.subsystems,
+            "errors": self.errors,
+            "startup_seconds": round(startup_seconds, 3),
+            "startup_budget_seconds": STARTUP_BUDGET_SECONDS,
+            "within_budget": startup_seconds <= STARTUP_BUDGET_SECONDS,
+        }
+
+# Database and event bus gate readiness; the rest are warmed in the background
+readiness = Readiness(required=["database", "event_bus"], optional=["environments", "models", "analytics"])
+
+class DiscoveryCache:
+    """Caches a slow discovery command, serving the stale value while it refreshes"""
+    def __init__(self, loader, ttl: float = DISCOVERY_CACHE_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self.value = None
+        self.loaded_at = 0.0
+        self.lock = asyncio.Lock()
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.value is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    async def refresh(self):
+        async with self.lock:
+            if not self.is_fresh():
+                self.value = await asyncio.to_thread(self.loader)
+                self.loaded_at = time.monotonic()
+        return self.value
+
+    async def get(self):
+        if self.value is None:
+            return await self.refresh()
+        if not self.is_fresh() and (self.refresh_task is None or self.refresh_task.done()):
+            self.refresh_task = asyncio.create_task(self.refresh())
+        return self.value
 
 # Utility functions
-async def get_conda_environments():
-    """Get list of available conda environments"""
+def list_conda_environments():
+    """List available conda environments (blocking)"""
     try:
         result = subprocess.run(
             ["conda", "env", "list", "--json"],
@@ -135,8 +697,8 @@ async def get_conda_environments():
         # Return mock data for demo purposes when conda is not available
         return ["garak_env", "promptmap_env", "security_test_env"]
 
-async def get_ollama_models():
-    """Get list of available Ollama models"""
+def list_ollama_models():
+    """List available Ollama models (blocking)"""
     try:
         result = subprocess.run(
             ["ollama", "list"],
@@ -158,6 +720,17 @@ async def get_ollama_models():
         # Return mock data for demo purposes when ollama is not available
         return ["llama3:latest", "llama3:8b", "gemma:7b", "mistral:7b", "codellama:7b"]
 
+environment_cache = DiscoveryCache(list_conda_environments)
+model_cache = DiscoveryCache(list_ollama_models)
+
+async def get_conda_environments():
+    """Get list of available conda environments"""
+    return await environment_cache.get()
+
+async def get_ollama_models():
+    """Get list of available Ollama models"""
+    return await model_cache.get()
+
 async def get_garak_probes():
     """Get list of available Garak probes"""
     garak_probes = [
@@ -198,7 +771,40 @@ async def get_garak_probes():
     ]
     return garak_probes
 
-async def run_garak_scan(environment: str, model_name: str, probes: List[str], websocket: WebSocket):
+# Garak prints one summary line per probe/detector pair, e.g.
+# "dan.Dan_11_0    dan.DAN: FAIL  ok on    3/  10   (failure rate: 70.00%)"
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*m')
+GARAK_RESULT_RE = re.compile(
+    r'^(?P<probe>[\w.]+)\s+(?P<detector>[\w.]+):\s+(?P<outcome>PASS|FAIL)\s+ok on\s+(?P<passed>\d+)\s*/\s*(?P<total>\d+)'
+)
+GARAK_REPORT_RE = re.compile(r'reporting to (?P<path>\S+\.report\.jsonl)')
+
+def parse_garak_result(line: str) -> Optional[Dict]:
+    """Parse a garak probe/detector summary line, if the line is one"""
+    match = GARAK_RESULT_RE.match(ANSI_ESCAPE_RE.sub('', line).strip())
+    if not match:
+        return None
+    return {
+        "probe": match.group("probe"),
+        "detector": match.group("detector"),
+        "passed": int(match.group("passed")),
+        "total": int(match.group("total")),
+    }
+
+async def record_scan_result(session_id: str, result: Dict):
+    """Store a parsed probe/detector result for a session"""
+    query = scan_results_table.insert().values(
+        session_id=session_id,
+        probe=result["probe"],
+        detector=result["detector"],
+        passed=result["passed"],
+        total=result["total"],
+        created_at=datetime.utcnow()
+    )
+    with tracer.span(session_id, "db.insert scan_results", "database"):
+        await database.execute(query)
+
+async def run_garak_scan(environment: str, model_name: str, probes: List[str], session_id: str):
     """Run Garak scan with real-time output"""
     try:
         # Create the command
@@ -213,40 +819,42 @@ async def run_garak_scan(environment: str, model_name: str, probes: List[str], w
         ]
 
         # Send command info to WebSocket
-        await manager.send_personal_message(f"🚀 Starting Garak scan...", websocket)
-        await manager.send_personal_message(f"📋 Environment: {environment}", websocket)
-        await manager.send_personal_message(f"🤖 Model: {model_name}", websocket)
-        await manager.send_personal_message(f"🔍 Probes: {probe_str}", websocket)
-        await manager.send_personal_message(f"⚡ Running command: {' '.join(command)}", websocket)
+        await bus.publish(session_id, f"🚀 Starting Garak scan...")
+        await bus.publish(session_id, f"📋 Environment: {environment}")
+        await bus.publish(session_id, f"🤖 Model: {model_name}")
+        await bus.publish(session_id, f"🔍 Probes: {probe_str}")
+        await bus.publish(session_id, f"⚡ Running command: {' '.join(command)}")
 
         # Check if conda is available
         try:
-            conda_check = await asyncio.create_subprocess_exec(
-                "conda", "--version",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            await conda_check.wait()
+            with tracer.span(session_id, "subprocess conda --version", "subprocess"):
+                conda_check = await asyncio.create_subprocess_exec(
+                    "conda", "--version",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                await conda_check.wait()
             if conda_check.returncode != 0:
-                await manager.send_personal_message("❌ Conda not found. Please install Miniconda/Anaconda.", websocket)
+                await bus.publish(session_id, "❌ Conda not found. Please install Miniconda/Anaconda.")
                 return False, "Conda not found"
         except Exception as e:
-            await manager.send_personal_message(f"❌ Conda not available: {str(e)}", websocket)
+            await bus.publish(session_id, f"❌ Conda not available: {str(e)}")
             return False, f"Conda not available: {str(e)}"
 
         # Check if environment exists
         try:
-            env_check = await asyncio.create_subprocess_exec(
-                "conda", "env", "list",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await env_check.communicate()
+            with tracer.span(session_id, "subprocess conda env list", "subprocess"):
+                env_check = await asyncio.create_subprocess_exec(
+                    "conda", "env", "list",
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                stdout, stderr = await env_check.communicate()
             if environment not in stdout.decode('utf-8', errors='replace'):
-                await manager.send_personal_message(f"❌ Environment '{environment}' not found.", websocket)
+                await bus.publish(session_id, f"❌ Environment '{environment}' not found.")
                 return False, f"Environment '{environment}' not found"
         except Exception as e:
-            await manager.send_personal_message(f"❌ Error checking environment: {str(e)}", websocket)
+            await bus.publish(session_id, f"❌ Error checking environment: {str(e)}")
             return False, f"Error checking environment: {str(e)}"
 
         # Set environment variables to fix Unicode issues
@@ -255,12 +863,17 @@ async def run_garak_scan(environment: str, model_name: str, probes: List[str], w
         env['PYTHONUTF8'] = '1'
 
         # Start the process with proper encoding handling
+        process_span = tracer.start(session_id, "subprocess garak", "subprocess")
         process = await asyncio.create_subprocess_exec(
             *command,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT,
-            env=env
+            env=env,
+            start_new_session=True  # own process group, so cancel reaches the tool and not just `conda run`
         )
+        scan_processes[session_id] = process
+        tracer.instant(session_id, "process spawned", "subprocess", pid=process.pid)
+        probe_tracker = ProbeTracker(session_id)
 
         # Stream output in real-time
         while True:
@@ -270,24 +883,37 @@ async def run_garak_scan(environment: str, model_name: str, probes: List[str], w
             # Decode with error handling for Unicode issues
             decoded_line = line.decode('utf-8', errors='replace').strip()
             if decoded_line:
-                await manager.send_personal_message(decoded_line, websocket)
+                await bus.publish(session_id, decoded_line)
+                result = parse_garak_result(decoded_line)
+                probe_tracker.feed(decoded_line, result)
+                if result:
+                    await record_scan_result(session_id, result)
+                report_match = GARAK_REPORT_RE.search(decoded_line)
+                if report_match:
+                    update_query = scan_sessions_table.update().where(
+                        scan_sessions_table.c.id == session_id
+                    ).values(output_file=report_match.group("path"))
+                    with tracer.span(session_id, "db.update output_file", "database"):
+                        await database.execute(update_query)
 
         # Wait for process to complete
         await process.wait()
+        probe_tracker.close()
+        tracer.end(process_span, returncode=process.returncode)
 
         if process.returncode == 0:
-            await manager.send_personal_message("✅ Scan completed successfully!", websocket)
+            await bus.publish(session_id, "✅ Scan completed successfully!")
             return True, None
         else:
-            await manager.send_personal_message(f"❌ Scan failed with return code: {process.returncode}", websocket)
+            await bus.publish(session_id, f"❌ Scan failed with return code: {process.returncode}")
             return False, f"Process failed with return code: {process.returncode}"
 
     except Exception as e:
         error_msg = f"Error running Garak scan: {str(e)}"
-        await manager.send_personal_message(f"❌ {error_msg}", websocket)
+        await bus.publish(session_id, f"❌ {error_msg}")
         return False, error_msg
 
-async def run_promptmap_scan(environment: str, model_name: str, promptmap_directory: str, websocket: WebSocket):
+async def run_promptmap_scan(environment: str, model_name: str, promptmap_directory: str, session_id: str):
     """Run Promptmap scan with real-time output"""
     try:
         # Create the command for promptmap
@@ -300,21 +926,21 @@ async def run_promptmap_scan(environment: str, model_name: str, promptmap_direct
         ]
 
         # Send command info to WebSocket
-        await manager.send_personal_message(f"🚀 Starting Promptmap scan...", websocket)
-        await manager.send_personal_message(f"📋 Environment: {environment}", websocket)
-        await manager.send_personal_message(f"🤖 Model: {model_name}", websocket)
-        await manager.send_personal_message(f"📁 Directory: {promptmap_directory}", websocket)
-        await manager.send_personal_message(f"⚡ Running command: {' '.join(command)}", websocket)
+        await bus.publish(session_id, f"🚀 Starting Promptmap scan...")
+        await bus.publish(session_id, f"📋 Environment: {environment}")
+        await bus.publish(session_id, f"🤖 Model: {model_name}")
+        await bus.publish(session_id, f"📁 Directory: {promptmap_directory}")
+        await bus.publish(session_id, f"⚡ Running command: {' '.join(command)}")
         
         # Validate promptmap directory exists
         if not os.path.exists(promptmap_directory):
-            await manager.send_personal_message(f"❌ Promptmap directory does not exist: {promptmap_directory}", websocket)
+            await bus.publish(session_id, f"❌ Promptmap directory does not exist: {promptmap_directory}")
             return False, f"Promptmap directory does not exist: {promptmap_directory}"
         
         # Check if promptmap2.py exists in the directory
         promptmap_script = os.path.join(promptmap_directory, "promptmap2.py")
         if not os.path.exists(promptmap_script):
-            await manager.send_personal_message(f"❌ promptmap2.py not found in directory: {promptmap_directory}", websocket)
+            await bus.publish(session_id, f"❌ promptmap2.py not found in directory: {promptmap_directory}")
             return False, f"promptmap2.py not found in directory: {promptmap_directory}"
 
         # Set environment variables to fix Unicode issues
@@ -323,14 +949,18 @@ async def run_promptmap_scan(environment: str, model_name: str, promptmap_direct
         env['PYTHONUTF8'] = '1'
 
         # Change to the promptmap directory and start the process
-        await manager.send_personal_message(f"📂 Changing to directory: {promptmap_directory}", websocket)
+        await bus.publish(session_id, f"📂 Changing to directory: {promptmap_directory}")
+        process_span = tracer.start(session_id, "subprocess promptmap2.py", "subprocess")
         process = await asyncio.create_subprocess_exec(
             *command,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT,
             env=env,
-            cwd=promptmap_directory  # Change to the specified directory
+            cwd=promptmap_directory,  # Change to the specified directory
+            start_new_session=True
         )
+        scan_processes[session_id] = process
+        tracer.instant(session_id, "process spawned", "subprocess", pid=process.pid)
 
         # Stream output in real-time
         while True:
@@ -340,23 +970,1224 @@ async def run_promptmap_scan(environment: str, model_name: str, promptmap_direct
             # Decode with error handling for Unicode issues
             decoded_line = line.decode('utf-8', errors='replace').strip()
             if decoded_line:
-                await manager.send_personal_message(decoded_line, websocket)
+                await bus.publish(session_id, decoded_line)
 
         # Wait for process to complete
         await process.wait()
+        tracer.end(process_span, returncode=process.returncode)
 
         if process.returncode == 0:
-            await manager.send_personal_message("✅ Scan completed successfully!", websocket)
+            await bus.publish(session_id, "✅ Scan completed successfully!")
             return True, None
         else:
-            await manager.send_personal_message(f"❌ Scan failed with return code: {process.returncode}", websocket)
+            await bus.publish(session_id, f"❌ Scan failed with return code: {process.returncode}")
             return False, f"Process failed with return code: {process.returncode}"
 
     except Exception as e:
         error_msg = f"Error running Promptmap scan: {str(e)}"
-        await manager.send_personal_message(f"❌ {error_msg}", websocket)
+        await bus.publish(session_id, f"❌ {error_msg}")
         return False, error_msg
 
+# Admission control
+ADMISSION_MAX_SESSIONS = int(os.environ.get("ADMISSION_MAX_SESSIONS", "20"))
+ADMISSION_MAX_WORK = float(os.environ.get("ADMISSION_MAX_WORK", "400"))
+ADMISSION_MAX_WORK_PER_MODEL = float(os.environ.get("ADMISSION_MAX_WORK_PER_MODEL", "200"))
+ADMISSION_MAX_SESSIONS_PER_CLIENT = int(os.environ.get("ADMISSION_MAX_SESSIONS_PER_CLIENT", "5"))
+ADMISSION_CLIENT_QUOTAS: Dict[str, int] = json.loads(os.environ.get("ADMISSION_CLIENT_QUOTAS", "{}"))
+ADMISSION_PENDING_TIMEOUT = float(os.environ.get("ADMISSION_PENDING_TIMEOUT", "900"))
+ADMISSION_DEFAULT_SECONDS_PER_WORK = 30.0
+PROMPTMAP_WORK = 10.0
+MODEL_SIZE_RE = re.compile(r'(\d+(?:\.\d+)?)b\b', re.IGNORECASE)
+
+def estimate_scan_work(tool: str, model_name: str, probes: List[str]) -> float:
+    """Estimate scan cost in probe units, scaled by model size when the tag gives it"""
+    units = PROMPTMAP_WORK if tool == "promptmap" else float(max(len(probes), 1))
+    size = MODEL_SIZE_RE.search(model_name)
+    scale = max(float(size.group(1)) / 8.0, 1.0) if size else 1.0
+    return round(units * scale, 2)
+
+def active_sessions_clause():
+    """Running sessions whose owner is still heartbeating, or pending sessions recent enough to be claimed
+
+    A worker that was killed leaves its sessions ``running`` until they are reaped;
+    they must not hold queue capacity in the meantime.
+    """
+    now = datetime.utcnow()
+    return sqlalchemy.or_(
+        sqlalchemy.and_(
+            scan_sessions_table.c.status == "running",
+            scan_sessions_table.c.heartbeat_at >= now - timedelta(seconds=HEARTBEAT_TIMEOUT)
+        ),
+        sqlalchemy.and_(
+            scan_sessions_table.c.status == "pending",
+            scan_sessions_table.c.created_at >= now - timedelta(seconds=ADMISSION_PENDING_TIMEOUT)
+        )
+    )
+
+class AdmissionController:
+    """Admits scan submissions against queue depth, estimated work and per-client quotas"""
+    def __init__(self):
+        self.lock = asyncio.Lock()
+
+    async def snapshot(self) -> Dict:
+        """Summarize active (running or recently pending) sessions"""
+        work = sqlalchemy.func.coalesce(scan_sessions_table.c.estimated_work, 1.0)
+        query = sqlalchemy.select(
+            scan_sessions_table.c.model_name,
+            scan_sessions_table.c.client_name,
+            sqlalchemy.func.count(scan_sessions_table.c.id).label("sessions"),
+            sqlalchemy.func.sum(work).label("work"),
+        ).where(
+            scan_sessions_table.c.alias_of.is_(None),  # attached requests share their primary's run
+            active_sessions_clause()
+        ).group_by(scan_sessions_table.c.model_name, scan_sessions_table.c.client_name)
+        rows = await database.fetch_all(query)
+
+        models: Dict[str, Dict] = {}
+        clients: Dict[str, int] = {}
+        for row in rows:
+            model = models.setdefault(row["model_name"], {"sessions": 0, "work": 0.0})
+            model["sessions"] += row["sessions"]
+            model["work"] += row["work"] or 0.0
+            if row["client_name"]:
+                clients[row["client_name"]] = clients.get(row["client_name"], 0) + row["sessions"]
+        return {
+            "sessions": sum(model["sessions"] for model in models.values()),
+            "work": sum(model["work"] for model in models.values()),
+            "models": models,
+            "clients": clients,
+        }
+
+    async def seconds_per_work(self) -> float:
+        """Average wall time per work unit over recently completed scans"""
+        query = scan_sessions_table.select().where(
+            scan_sessions_table.c.status == "completed",
+            scan_sessions_table.c.estimated_work.isnot(None),
+            scan_sessions_table.c.alias_of.is_(None)
+        ).order_by(scan_sessions_table.c.completed_at.desc()).limit(50)
+        rows = await database.fetch_all(query)
+        seconds = sum((row["completed_at"] - row["created_at"]).total_seconds() for row in rows)
+        work = sum(row["estimated_work"] for row in rows)
+        return seconds / work if seconds > 0 and work > 0 else ADMISSION_DEFAULT_SECONDS_PER_WORK
+
+    def client_quota(self, client_name: str) -> int:
+        return int(ADMISSION_CLIENT_QUOTAS.get(client_name, ADMISSION_MAX_SESSIONS_PER_CLIENT))
+
+    async def check(self, model_name: str, client_name: Optional[str], work: float):
+        """Raise 429 with Retry-After if admitting this scan would exceed capacity"""
+        snapshot = await self.snapshot()
+        model_work = snapshot["models"].get(model_name, {}).get("work", 0.0)
+
+        reason, excess = None, 0.0
+        if client_name and snapshot["clients"].get(client_name, 0) >= self.client_quota(client_name):
+            reason, excess = f"Client '{client_name}' has reached its quota of {self.client_quota(client_name)} active scans", work
+        elif snapshot["sessions"] >= ADMISSION_MAX_SESSIONS:
+            reason, excess = f"Scan queue is full ({snapshot['sessions']}/{ADMISSION_MAX_SESSIONS} sessions)", work
+        # A single oversized scan is still admitted when nothing else is queued
+        elif snapshot["work"] > 0 and snapshot["work"] + work > ADMISSION_MAX_WORK:
+            reason, excess = "Scan queue is over its work capacity", snapshot["work"] + work - ADMISSION_MAX_WORK
+        elif model_work > 0 and model_work + work > ADMISSION_MAX_WORK_PER_MODEL:
+            reason, excess = f"Model '{model_name}' is over its work capacity", model_work + work - ADMISSION_MAX_WORK_PER_MODEL
+        if not reason:
+            return
+
+        retry_after = int(min(max(math.ceil(excess * await self.seconds_per_work()), 1), 3600))
+        raise HTTPException(status_code=429, detail=reason, headers={"Retry-After": str(retry_after)})
+
+admission = AdmissionController()
+
+# Single-flight deduplication
+# A request identical to a pending or running scan is stored as an alias of it: the alias
+# follows the primary's stream, shares its results and mirrors its status.
+async def find_identical_scan(session: ScanSession) -> Optional[Dict]:
+    """The oldest pending or running primary session with the same scan parameters"""
+    query = scan_sessions_table.select().where(
+        scan_sessions_table.c.environment == session.environment,
+        scan_sessions_table.c.model_name == session.model_name,
+        scan_sessions_table.c.tool == session.tool,
+        scan_sessions_table.c.alias_of.is_(None),
+        active_sessions_clause()
+    ).order_by(scan_sessions_table.c.created_at)
+    for row in await database.fetch_all(query):
+        if sorted(json.loads(row["probes"])) == sorted(session.probes) and row["promptmap_directory"] == session.promptmap_directory:
+            return dict(row)
+    return None
+
+async def update_aliases(session_id: str, **values):
+    """Mirror a primary session's status onto the requests still attached to it"""
+    query = scan_sessions_table.update().where(
+        scan_sessions_table.c.alias_of == session_id,
+        scan_sessions_table.c.status.in_(["pending", "running"])
+    ).values(**values)
+    await database.execute(query)
+
+async def live_aliases(session_id: str) -> List[Dict]:
+    query = scan_sessions_table.select().where(
+        scan_sessions_table.c.alias_of == session_id,
+        scan_sessions_table.c.status.in_(["pending", "running"])
+    ).order_by(scan_sessions_table.c.created_at)
+    return [dict(row) for row in await database.fetch_all(query)]
+
+async def detach_primary(session_id: str) -> bool:
+    """Detach the requester of a shared scan, handing its client quota to the oldest attached request
+
+    Returns False when no attached request is waiting, so the scan itself should stop.
+    """
+    async with immediate_transaction():
+        aliases = await live_aliases(session_id)
+        if not aliases:
+            return False
+        update_query = scan_sessions_table.update().where(
+            scan_sessions_table.c.id == session_id
+        ).values(detached_at=datetime.utcnow(), client_name=aliases[0]["client_name"])
+        await database.execute(update_query)
+    # Closes the requester's own followers, wherever they are connected
+    await bus.publish(session_id, "detached", kind="detach")
+    return True
+
+async def resolve_session_id(session_id: str) -> str:
+    """The session whose output, results and trace a request shares"""
+    query = sqlalchemy.select(scan_sessions_table.c.alias_of).where(scan_sessions_table.c.id == session_id)
+    row = await database.fetch_one(query)
+    return row["alias_of"] if row and row["alias_of"] else session_id
+
+async def resolve_session_ids(session_ids: Optional[List[str]]) -> Optional[List[str]]:
+    if not session_ids:
+        return session_ids
+    query = sqlalchemy.select(scan_sessions_table.c.id, scan_sessions_table.c.alias_of).where(
+        scan_sessions_table.c.id.in_(session_ids)
+    )
+    primaries = {row["id"]: row["alias_of"] for row in await database.fetch_all(query) if row["alias_of"]}
+    return list(dict.fromkeys(primaries.get(session_id, session_id) for session_id in session_ids))
+
+# Scan execution
+SCAN_COMMANDS = {"cancel"}
+
+async def claim_scan(session_dict: Dict) -> bool:
+    """Atomically take ownership of a pending session and start it on this worker"""
+    session_id = session_dict["id"]
+    update_query = scan_sessions_table.update().where(
+        scan_sessions_table.c.id == session_id,
+        scan_sessions_table.c.status == "pending"
+    ).values(status="running", worker_id=WORKER_ID, heartbeat_at=datetime.utcnow())
+    with tracer.span(session_id, "db.claim", "database"):
+        await database.execute(update_query)
+        query = scan_sessions_table.select().where(scan_sessions_table.c.id == session_id)
+        result = await database.fetch_one(query)
+    if result["status"] != "running" or result["worker_id"] != WORKER_ID or session_id in running_scans:
+        return False
+
+    session_dict = dict(result)
+    session_dict["probes"] = json.loads(session_dict["probes"])
+    running_scans[session_id] = asyncio.create_task(execute_scan(session_dict))
+    await update_aliases(session_id, status="running")
+    return True
+
+async def execute_scan(session_dict: Dict):
+    """Run a claimed scan and record its outcome"""
+    session_id = session_dict["id"]
+    status, error = "failed", None
+    run_span = tracer.start(session_id, f"{session_dict['tool']}.run", "scan", model_name=session_dict["model_name"])
+    try:
+        # Run the scan based on tool type
+        if session_dict["tool"] == "garak":
+            success, error = await run_garak_scan(
+                session_dict["environment"],
+                session_dict["model_name"],
+                session_dict["probes"],
+                session_id
+            )
+        elif session_dict["tool"] == "promptmap":
+            success, error = await run_promptmap_scan(
+                session_dict["environment"],
+                session_dict["model_name"],
+                session_dict["promptmap_directory"],
+                session_id
+            )
+        else:
+            success, error = False, f"Unknown tool: {session_dict['tool']}"
+            await bus.publish(session_id, f"❌ {error}")
+        status = "completed" if success else "failed"
+    except asyncio.CancelledError:
+        error = "Cancelled"
+        await bus.publish(session_id, "🛑 Scan cancelled")
+    except Exception as e:
+        error = str(e)
+        await bus.publish(session_id, f"❌ Error: {error}")
+    finally:
+        process = scan_processes.pop(session_id, None)
+        # The tool runs under `conda run`, so its children must be stopped with it
+        if process and status != "completed":
+            await stop_scan_process(process)
+        running_scans.pop(session_id, None)
+        tracer.end(run_span, status=status)
+        tracer.close_session(session_id)
+
+    # Update session status
+    update_values = {
+        "status": status,
+        "completed_at": datetime.utcnow()
+    }
+    if error:
+        update_values["error_message"] = error
+
+    update_query = scan_sessions_table.update().where(
+        scan_sessions_table.c.id == session_id
+    ).values(**update_values)
+    with tracer.span(session_id, "db.update status", "database", status=status):
+        await database.execute(update_query)
+        await update_aliases(session_id, **update_values)
+    if status == "completed":
+        analytics_cache.invalidate()
+    await bus.publish(session_id, status, kind="end")
+
+async def has_end_event(session_id: str) -> bool:
+    query = sqlalchemy.select(scan_events_table.c.id).where(
+        scan_events_table.c.session_id == session_id,
+        scan_events_table.c.kind == "end"
+    ).limit(1)
+    return await database.fetch_one(query) is not None
+
+async def reap_stale_scan(session_id: str):
+    """Fail a running scan whose owning worker stopped sending heartbeats"""
+    if session_id in running_scans:
+        return
+    query = scan_sessions_table.select().where(scan_sessions_table.c.id == session_id)
+    result = await database.fetch_one(query)
+    cutoff = datetime.utcnow() - timedelta(seconds=HEARTBEAT_TIMEOUT)
+    if not result or result["status"] != "running" or result["alias_of"]:
+        return
+    if result["heartbeat_at"] and result["heartbeat_at"] > cutoff:
+        return
+
+    # Every worker sweeps for stale scans; taking over worker_id makes exactly one of them the reaper
+    error = f"Worker {result['worker_id']} stopped responding"
+    update_query = scan_sessions_table.update().where(
+        scan_sessions_table.c.id == session_id,
+        scan_sessions_table.c.status == "running",
+        sqlalchemy.or_(scan_sessions_table.c.heartbeat_at.is_(None), scan_sessions_table.c.heartbeat_at <= cutoff)
+    ).values(status="failed", error_message=error, completed_at=datetime.utcnow(), worker_id=WORKER_ID)
+    await database.execute(update_query)
+    result = await database.fetch_one(query)
+    if result["status"] != "failed" or result["worker_id"] != WORKER_ID or result["error_message"] != error:
+        return
+    await update_aliases(session_id, status="failed", error_message=error, completed_at=result["completed_at"])
+    await bus.publish(session_id, f"❌ {error}")
+    await bus.publish(session_id, "failed", kind="end")
+
+async def reap_stale_scans():
+    """Reap every stale running scan, whether or not a client is following it"""
+    cutoff = datetime.utcnow() - timedelta(seconds=HEARTBEAT_TIMEOUT)
+    query = sqlalchemy.select(scan_sessions_table.c.id).where(
+        scan_sessions_table.c.status == "running",
+        scan_sessions_table.c.alias_of.is_(None),  # attached requests mirror their primary's status
+        sqlalchemy.or_(scan_sessions_table.c.heartbeat_at.is_(None), scan_sessions_table.c.heartbeat_at <= cutoff)
+    )
+    for row in await database.fetch_all(query):
+        await reap_stale_scan(row["id"])
+
+async def listen_for_commands(websocket: WebSocket, session_id: str, stream_id: str):
+    """Forward control commands sent by a WebSocket client to the worker that owns the scan"""
+    try:
+        while True:
+            message = (await websocket.receive_text()).strip()
+            if message in SCAN_COMMANDS:
+                result = await cancel_scan(session_id)
+                # A detached primary's followers are closed by the detach event on its stream
+                if result["status"] == "detached" and session_id != stream_id:
+                    await manager.send_personal_message("🛑 Detached from the shared scan", websocket)
+                    await websocket.close()
+                    return
+    except WebSocketDisconnect:
+        pass
+
+# Analytics
+class AnalyticsCache:
+    """Materialized probe/detector results of completed sessions, refreshed incrementally"""
+    def __init__(self, refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.frame: Optional["pd.DataFrame"] = None
+        self.version = None
+        self.checked_at = 0.0
+        self.stale = True
+        self.lock = asyncio.Lock()
+
+    def invalidate(self, reload: bool = False):
+        """Mark the aggregates stale so the next read re-checks the database
+
+        ``reload`` drops the materialized frame, for when sessions were deleted.
+        """
+        self.stale = True
+        if reload:
+            self.frame = None
+
+    async def fetch_version(self):
+        query = sqlalchemy.select(
+            sqlalchemy.func.count(scan_sessions_table.c.id),
+            sqlalchemy.func.max(scan_sessions_table.c.completed_at)
+        ).where(scan_sessions_table.c.status == "completed")
+        row = await database.fetch_one(query)
+        return (row[0], row[1])
+
+    async def load(self, completed_after: Optional[datetime] = None) -> "pd.DataFrame":
+        """Load completed session results, optionally only those completed after a point in time"""
+        import pandas as pd
+
+        query = sqlalchemy.select(
+            scan_results_table.c.session_id,
+            scan_results_table.c.probe,
+            scan_results_table.c.detector,
+            scan_results_table.c.passed,
+            scan_results_table.c.total,
+            scan_sessions_table.c.model_name,
+            scan_sessions_table.c.environment,
+            scan_sessions_table.c.tool,
+            scan_sessions_table.c.created_at,
+            scan_sessions_table.c.completed_at,
+        ).select_from(
+            scan_results_table.join(scan_sessions_table, scan_results_table.c.session_id == scan_sessions_table.c.id)
+        ).where(scan_sessions_table.c.status == "completed")
+        if completed_after is not None:
+            query = query.where(scan_sessions_table.c.completed_at > completed_after)
+        rows = await database.fetch_all(query)
+        frame = pd.DataFrame(
+            [dict(row) for row in rows],
+            columns=["session_id", "probe", "detector", "passed", "total", "model_name",
+                     "environment", "tool", "created_at", "completed_at"]
+        )
+        frame["passed"] = frame["passed"].astype("int64")
+        frame["total"] = frame["total"].astype("int64")
+        frame["created_at"] = pd.to_datetime(frame["created_at"])
+        frame["completed_at"] = pd.to_datetime(frame["completed_at"])
+        return frame
+
+    async def get_frame(self) -> "pd.DataFrame":
+        """Return the materialized results, reloading only what changed since the last read"""
+        import pandas as pd
+
+        now = asyncio.get_running_loop().time()
+        if self.frame is not None and not self.stale and now - self.checked_at < self.refresh_interval:
+            return self.frame
+        async with self.lock:
+            version = await self.fetch_version()
+            self.checked_at = asyncio.get_running_loop().time()
+            self.stale = False
+            if self.frame is not None and version == self.version:
+                return self.frame
+            if self.frame is not None and self.version[1] is not None and version[0] > self.version[0]:
+                # Sessions only ever complete later, so append the new ones unless rows were removed
+                added = await self.load(completed_after=self.version[1])
+                if added["session_id"].nunique() <= version[0] - self.version[0]:
+                    self.frame = pd.concat([self.frame, added], ignore_index=True)
+                    self.version = version
+                    return self.frame
+            self.frame = await self.load()
+            self.version = version
+            return self.frame
+
+analytics_cache = AnalyticsCache()
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert a timezone-aware query parameter to the naive UTC stored in the database"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def select_results(frame: "pd.DataFrame", session_ids: Optional[List[str]] = None, model_name: Optional[str] = None,
+                   since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   probe: Optional[str] = None, detector: Optional[str] = None) -> "pd.DataFrame":
+    """Filter materialized results with vectorized masks"""
+    import numpy as np
+    import pandas as pd
+
+    since, until = naive_utc(since), naive_utc(until)
+    mask = np.ones(len(frame), dtype=bool)
+    if session_ids:
+        mask &= frame["session_id"].isin(session_ids).to_numpy()
+    if model_name:
+        mask &= (frame["model_name"] == model_name).to_numpy()
+    if since:
+        mask &= (frame["created_at"] >= pd.Timestamp(since)).to_numpy()
+    if until:
+        mask &= (frame["created_at"] < pd.Timestamp(until)).to_numpy()
+    if probe:
+        mask &= (frame["probe"] == probe).to_numpy()
+    if detector:
+        mask &= (frame["detector"] == detector).to_numpy()
+    return frame[mask]
+
+def summarize_results(frame: "pd.DataFrame") -> "pd.DataFrame":
+    """Aggregate pass counts per probe/detector"""
+    return frame.groupby(["probe", "detector"]).agg(
+        passed=("passed", "sum"),
+        total=("total", "sum"),
+        sessions=("session_id", "nunique"),
+    )
+
+def compare_results(baseline: "pd.DataFrame", candidate: "pd.DataFrame", alpha: float = 0.05) -> "pd.DataFrame":
+    """Compute pass-rate deltas and a two-proportion z-test per probe/detector"""
+    import numpy as np
+
+    merged = summarize_results(baseline).join(
+        summarize_results(candidate), how="outer", lsuffix="_baseline", rsuffix="_candidate"
+    ).reset_index()
+    passed_b = merged["passed_baseline"].to_numpy(dtype=float)
+    total_b = merged["total_baseline"].to_numpy(dtype=float)
+    passed_c = merged["passed_candidate"].to_numpy(dtype=float)
+    total_c = merged["total_candidate"].to_numpy(dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate_b = np.where(total_b > 0, passed_b / total_b, np.nan)
+        rate_c = np.where(total_c > 0, passed_c / total_c, np.nan)
+        pooled = (passed_b + passed_c) / (total_b + total_c)
+        stderr = np.sqrt(pooled * (1 - pooled) * (1 / total_b + 1 / total_c))
+        z = np.where(stderr > 0, (rate_c - rate_b) / stderr, 0.0)
+    both = ~np.isnan(rate_b) & ~np.isnan(rate_c)
+    z = np.where(both, z, np.nan)
+    p_value = np.where(both, np.frompyfunc(math.erfc, 1, 1)(np.abs(np.nan_to_num(z)) / math.sqrt(2)).astype(float), np.nan)
+    significant = both & (p_value < alpha)
+    delta = rate_c - rate_b
+
+    merged["pass_rate_baseline"] = rate_b
+    merged["pass_rate_candidate"] = rate_c
+    merged["delta"] = delta
+    merged["z_score"] = z
+    merged["p_value"] = p_value
+    merged["significant"] = significant
+    merged["change"] = np.select(
+        [np.isnan(rate_b), np.isnan(rate_c), significant & (delta < 0), significant & (delta > 0)],
+        ["new", "missing", "regression", "improvement"],
+        default="unchanged"
+    )
+    return merged.sort_values(["significant", "delta"], ascending=[False, True])
+
+TREND_BUCKETS = {"day": "D", "week": "W", "month": "M"}
+
+def trend_results(frame: "pd.DataFrame", bucket: str) -> "pd.DataFrame":
+    """Aggregate pass rates per probe/detector over time buckets"""
+    import numpy as np
+
+    if bucket == "session":
+        # One point per session, placed at its creation time
+        grouped = frame.groupby(["probe", "detector", "session_id"]).agg(
+            bucket=("created_at", "first"),
+            passed=("passed", "sum"),
+            total=("total", "sum"),
+        ).reset_index()
+        grouped["sessions"] = 1
+    else:
+        keys = frame["created_at"].dt.to_period(TREND_BUCKETS[bucket]).dt.start_time
+        grouped = frame.assign(bucket=keys).groupby(["probe", "detector", "bucket"]).agg(
+            passed=("passed", "sum"),
+            total=("total", "sum"),
+            sessions=("session_id", "nunique"),
+        ).reset_index()
+    grouped["pass_rate"] = np.where(grouped["total"] > 0, grouped["passed"] / grouped["total"].clip(lower=1), np.nan)
+    return grouped.sort_values(["probe", "detector", "bucket"])
+
+def frame_to_records(frame: "pd.DataFrame") -> List[Dict]:
+    """Convert a frame to JSON-safe records (NaN becomes null)"""
+    return json.loads(frame.to_json(orient="records", date_format="iso"))
+
+# Archival and retention
+# Sessions that finished more than ARCHIVE_AFTER_HOURS ago are archived: their output log
+# moves from scan_events into a compressed file and their garak report is compressed in
+# place. Archives are runs of independently compressed frames with a JSON index alongside,
+# so a page of lines is read by decompressing only the frames that cover it.
+ARCHIVE_DIR = Path(os.environ.get("ARCHIVE_DIR", str(ROOT_DIR / "archive")))
+ARCHIVE_CODEC = os.environ.get("ARCHIVE_CODEC", "gzip")  # gzip, or zstd when zstandard is installed
+ARCHIVE_CODECS = {"gzip": ".gz", "zstd": ".zst"}
+ARCHIVE_FRAME_BYTES = 1 << 20  # uncompressed bytes per frame
+ARCHIVE_AFTER_HOURS = float(os.environ.get("ARCHIVE_AFTER_HOURS", "24"))
+ARCHIVE_MAX_BYTES = int(os.environ.get("ARCHIVE_MAX_BYTES", "0"))  # 0 disables the size cap
+RETENTION_DAYS = float(os.environ.get("RETENTION_DAYS", "90"))  # 0 keeps sessions forever
+STATUS_CHECK_RETENTION_DAYS = float(os.environ.get("STATUS_CHECK_RETENTION_DAYS", "30"))
+MAINTENANCE_INTERVAL = float(os.environ.get("MAINTENANCE_INTERVAL", "3600"))
+MAINTENANCE_LEASE_SECONDS = 600
+MAINTENANCE_BATCH_SIZE = 500
+MAINTENANCE_BATCH_PAUSE = 0.05  # between delete batches, so running scans get the write lock
+MAINTENANCE_VACUUM_PAGES = 2000  # free pages returned to the filesystem per pass
+GARAK_REPORT_SUFFIX = ".report.jsonl"
+
+def archive_codec(path: str) -> Optional[str]:
+    """The codec of an archive file, or None for a plain file"""
+    for codec, suffix in ARCHIVE_CODECS.items():
+        if path.endswith(suffix):
+            return codec
+    return None
+
+def archive_index_path(path: str) -> str:
+    return f"{path}.idx.json"
+
+def compress_frame(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+def decompress_frame(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+class ArchiveWriter:
+    """Write keyed lines as independently compressed frames, then the frame index"""
+    def __init__(self, path: str, codec: str):
+        self.path = path
+        self.codec = codec
+        self.file = open(path, "wb")
+        self.frames: List[Dict] = []
+        self.lines: List[bytes] = []
+        self.keys: List[int] = []
+        self.size = 0
+
+    def add(self, key: int, line: str):
+        data = line.rstrip("\n").encode("utf-8", errors="replace") + b"\n"
+        self.lines.append(data)
+        self.keys.append(key)
+        self.size += len(data)
+        if self.size >= ARCHIVE_FRAME_BYTES:
+            self.write_frame()
+
+    def write_frame(self):
+        if not self.lines:
+            return
+        data = compress_frame(b"".join(self.lines), self.codec)
+        self.frames.append({
+            "offset": self.file.tell(),
+            "length": len(data),
+            "first_key": self.keys[0],
+            "last_key": self.keys[-1],
+            "count": len(self.keys),
+        })
+        self.file.write(data)
+        self.lines, self.keys, self.size = [], [], 0
+
+    def close(self):
+        self.write_frame()
+        self.file.close()
+        with open(archive_index_path(self.path), "w") as index_file:
+            json.dump({"codec": self.codec, "frames": self.frames}, index_file)
+
+    def abort(self):
+        self.file.close()
+        remove_files([self.path, archive_index_path(self.path)])
+
+def read_archive_index(path: str) -> Dict:
+    with open(archive_index_path(path)) as index_file:
+        return json.load(index_file)
+
+def read_archive_frame(path: str, codec: str, frame: Dict) -> List[str]:
+    with open(path, "rb") as archive_file:
+        archive_file.seek(frame["offset"])
+        data = archive_file.read(frame["length"])
+    return decompress_frame(data, codec).decode("utf-8", errors="replace").splitlines()
+
+async def iterate_archive(path: str, first_key: int = 0):
+    """Yield the lines of each frame that holds keys from ``first_key`` on"""
+    index = await asyncio.to_thread(read_archive_index, path)
+    for frame in index["frames"]:
+        if frame["last_key"] < first_key:
+            continue
+        yield await asyncio.to_thread(read_archive_frame, path, index["codec"], frame)
+
+async def read_archived_log_page(path: str, before: Optional[int], limit: int):
+    """Read the archived output lines preceding ``before``, like a /logs page"""
+    index = await asyncio.to_thread(read_archive_index, path)
+    lines = []
+    for frame in reversed(index["frames"]):
+        if before is not None and frame["first_key"] >= before:
+            continue
+        entries = [json.loads(line) for line in await asyncio.to_thread(read_archive_frame, path, index["codec"], frame)]
+        if before is not None:
+            entries = [entry for entry in entries if entry["id"] < before]
+        lines = entries + lines
+        if len(lines) > limit:
+            break
+    return lines[-limit:], len(lines) > limit
+
+def compress_file(path: str, codec: str) -> str:
+    """Compress a line-oriented file into a seekable archive keyed by line number"""
+    archive_path = path + ARCHIVE_CODECS[codec]
+    writer = ArchiveWriter(archive_path, codec)
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as source:
+            for number, line in enumerate(source):
+                writer.add(number, line)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return archive_path
+
+def report_companions(report_path: str) -> List[str]:
+    """A report file plus the hitlog and HTML digest garak writes beside it"""
+    if not report_path.endswith(GARAK_REPORT_SUFFIX):
+        return [report_path]
+    base = report_path[:-len(GARAK_REPORT_SUFFIX)]
+    return [report_path, base + ".hitlog.jsonl", base + ".report.html"]
+
+def report_artifacts(output_file: str) -> List[str]:
+    """Every file a session's report may have left behind, compressed or not"""
+    codec = archive_codec(output_file)
+    report_path = output_file[:-len(ARCHIVE_CODECS[codec])] if codec else output_file
+    paths = []
+    for path in report_companions(report_path):
+        paths.append(path)
+        for suffix in ARCHIVE_CODECS.values():
+            paths += [path + suffix, archive_index_path(path + suffix)]
+    return paths
+
+def session_files(session: Dict) -> List[str]:
+    files = []
+    if session["log_archive"]:
+        files += [session["log_archive"], archive_index_path(session["log_archive"])]
+    if session["output_file"]:
+        files += report_artifacts(session["output_file"])
+    return files
+
+def files_size(paths: List[str]) -> int:
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+def remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+async def delete_in_batches(table, *conditions) -> int:
+    """Delete matching rows a batch at a time, so no single statement holds the write lock for long"""
+    key = list(table.primary_key.columns)[0]
+    deleted = 0
+    while True:
+        rows = await database.fetch_all(sqlalchemy.select(key).where(*conditions).limit(MAINTENANCE_BATCH_SIZE))
+        if not rows:
+            return deleted
+        ids = [row[0] for row in rows]
+        await database.execute(table.delete().where(key.in_(ids)))
+        deleted += len(ids)
+        await asyncio.sleep(MAINTENANCE_BATCH_PAUSE)
+
+class MaintenanceJob:
+    """Archive finished sessions, enforce retention and compact the database
+
+    Passes run on one API worker at a time, coordinated through a lease row.
+    """
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self.lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.last_report: Optional[Dict] = None
+
+    @property
+    def codec(self) -> str:
+        if ARCHIVE_CODEC == "zstd" and importlib.util.find_spec("zstandard") is not None:
+            return "zstd"
+        return "gzip"
+
+    def policy(self) -> Dict:
+        return {
+            "codec": self.codec,
+            "archive_after_hours": ARCHIVE_AFTER_HOURS,
+            "archive_max_bytes": ARCHIVE_MAX_BYTES,
+            "retention_days": RETENTION_DAYS,
+            "status_check_retention_days": STATUS_CHECK_RETENTION_DAYS,
+            "interval_seconds": self.interval,
+        }
+
+    def start(self):
+        self.task = asyncio.create_task(self.run_loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run_loop(self):
+        while True:
+            await asyncio.sleep(min(self.interval, 300))
+            try:
+                await self.run()
+            except Exception as e:
+                logging.error(f"Error running maintenance: {e}")
+
+    async def acquire(self, force: bool) -> Optional[str]:
+        """Take the lease unless another pass is running or, without ``force``, one ran recently"""
+        now = datetime.utcnow()
+        holder = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+        await database.execute(
+            maintenance_leases_table.insert().prefix_with("OR IGNORE").values(name="maintenance")
+        )
+        leases = maintenance_leases_table.c
+        conditions = [
+            leases.name == "maintenance",
+            sqlalchemy.or_(leases.expires_at.is_(None), leases.expires_at < now)
+        ]
+        if not force:
+            conditions.append(sqlalchemy.or_(
+                leases.finished_at.is_(None),
+                leases.finished_at < now - timedelta(seconds=self.interval)
+            ))
+        await database.execute(maintenance_leases_table.update().where(*conditions).values(
+            worker_id=holder, expires_at=now + timedelta(seconds=MAINTENANCE_LEASE_SECONDS)
+        ))
+        row = await database.fetch_one(maintenance_leases_table.select().where(leases.name == "maintenance"))
+        return holder if row["worker_id"] == holder else None
+
+    async def renew(self, holder: str):
+        await database.execute(maintenance_leases_table.update().where(
+            maintenance_leases_table.c.worker_id == holder
+        ).values(expires_at=datetime.utcnow() + timedelta(seconds=MAINTENANCE_LEASE_SECONDS)))
+
+    async def release(self, holder: str):
+        now = datetime.utcnow()
+        await database.execute(maintenance_leases_table.update().where(
+            maintenance_leases_table.c.worker_id == holder
+        ).values(expires_at=now, finished_at=now))
+
+    async def run(self, force: bool = False, rebuild: bool = False) -> Optional[Dict]:
+        """Run one pass if this worker gets the lease; returns the pass report
+
+        ``rebuild`` allows the one-off full VACUUM that enables incremental vacuum on
+        database files created without it; the background loop never passes it.
+        """
+        async with self.lock:
+            holder = await self.acquire(force)
+            if not holder:
+                return None
+            report = {
+                "worker_id": WORKER_ID,
+                "started_at": datetime.utcnow().isoformat(),
+                "archived_sessions": 0,
+                "compressed_files": 0,
+                "deleted_events": 0,
+                "expired_sessions": 0,
+                "purged_sessions": 0,
+                "deleted_status_checks": 0,
+                "vacuumed_pages": 0,
+                "errors": [],
+            }
+            started = time.monotonic()
+            try:
+                await self.archive_sessions(report, holder)
+                await self.expire_sessions(report, holder)
+                await self.enforce_archive_size(report, holder)
+                await self.expire_status_checks(report)
+                await self.compact(report, rebuild)
+            finally:
+                await self.release(holder)
+            report["duration_seconds"] = round(time.monotonic() - started, 3)
+            self.last_report = report
+            return report
+
+    async def archive_sessions(self, report: Dict, holder: str):
+        sessions = scan_sessions_table.c
+        finished_at = sqlalchemy.func.coalesce(sessions.completed_at, sessions.created_at)
+        query = scan_sessions_table.select().where(
+            sessions.status.in_(["completed", "failed"]),
+            sessions.archived_at.is_(None),
+            finished_at < datetime.utcnow() - timedelta(hours=ARCHIVE_AFTER_HOURS)
+        ).order_by(finished_at).limit(MAINTENANCE_BATCH_SIZE)
+        while True:
+            rows = await database.fetch_all(query)
+            if not rows:
+                return
+            for row in rows:
+                try:
+                    await self.archive_session(dict(row), report)
+                except OSError as e:
+                    # Most likely a full disk; retention below may free space for the next pass
+                    report["errors"].append(f"Archiving {row['id']}: {e}")
+                    return
+                await self.renew(holder)
+
+    async def archive_session(self, session: Dict, report: Dict):
+        session_id = session["id"]
+        codec = self.codec
+        updates = {"archived_at": datetime.utcnow()}
+
+        log_path = await self.archive_log(session_id, codec)
+        if log_path:
+            updates["log_archive"] = log_path
+
+        compressed = []
+        report_path = session["output_file"]
+        if report_path and not archive_codec(report_path):
+            for path in report_companions(report_path):
+                if path.endswith(".jsonl") and os.path.exists(path):
+                    compressed.append((path, await asyncio.to_thread(compress_file, path, codec)))
+            if compressed and compressed[0][0] == report_path:
+                updates["output_file"] = compressed[0][1]
+
+        await database.execute(scan_sessions_table.update().where(
+            scan_sessions_table.c.id == session_id
+        ).values(**updates))
+        # Readers switch to the archives with the update above, so the originals can go
+        await asyncio.to_thread(remove_files, [path for path, _ in compressed])
+        report["compressed_files"] += len(compressed)
+        report["deleted_events"] += await delete_in_batches(
+            scan_events_table, scan_events_table.c.session_id == session_id
+        )
+        report["archived_sessions"] += 1
+
+    async def archive_log(self, session_id: str, codec: str) -> Optional[str]:
+        """Copy a session's output events into a log archive; None when there is no output"""
+        query = sqlalchemy.select(scan_events_table.c.id, scan_events_table.c.payload).where(
+            scan_events_table.c.session_id == session_id,
+            scan_events_table.c.kind == "output"
+        ).order_by(scan_events_table.c.id).limit(MAINTENANCE_BATCH_SIZE)
+        page = await database.fetch_all(query)
+        if not page:
+            return None
+
+        await asyncio.to_thread(ARCHIVE_DIR.mkdir, parents=True, exist_ok=True)
+        path = str(ARCHIVE_DIR / f"{session_id}.log.jsonl{ARCHIVE_CODECS[codec]}")
+        writer = await asyncio.to_thread(ArchiveWriter, path, codec)
+
+        def add_page(rows):
+            for row in rows:
+                writer.add(row["id"], json.dumps({"id": row["id"], "text": row["payload"]}, ensure_ascii=False))
+
+        try:
+            while page:
+                await asyncio.to_thread(add_page, page)
+                if len(page) < MAINTENANCE_BATCH_SIZE:
+                    break
+                page = await database.fetch_all(query.where(scan_events_table.c.id > page[-1]["id"]))
+            await asyncio.to_thread(writer.close)
+        except BaseException:
+            await asyncio.to_thread(writer.abort)
+            raise
+        return path
+
+    async def purge_sessions(self, sessions: List[Dict]):
+        """Delete sessions with their results, events, spans and files"""
+        session_ids = [session["id"] for session in sessions]
+        for table in (scan_events_table, scan_spans_table, scan_results_table):
+            await delete_in_batches(table, table.c.session_id.in_(session_ids))
+        await delete_in_batches(scan_sessions_table, scan_sessions_table.c.id.in_(session_ids))
+        files = [path for session in sessions for path in session_files(session)]
+        await asyncio.to_thread(remove_files, files)
+        analytics_cache.invalidate(reload=True)
+
+    async def expire_sessions(self, report: Dict, holder: str):
+        if RETENTION_DAYS <= 0:
+            return
+        sessions = scan_sessions_table.c
+        finished_at = sqlalchemy.func.coalesce(sessions.completed_at, sessions.created_at)
+        cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+        query = scan_sessions_table.select().where(sqlalchemy.or_(
+            sqlalchemy.and_(sessions.status.in_(["completed", "failed"]), finished_at < cutoff),
+            # Never started by a WebSocket; admission stopped counting them after ADMISSION_PENDING_TIMEOUT
+            sqlalchemy.and_(
+                sessions.status == "pending",
+                sessions.created_at < cutoff - timedelta(seconds=ADMISSION_PENDING_TIMEOUT)
+            )
+        )).limit(100)
+        while True:
+            rows = [dict(row) for row in await database.fetch_all(query)]
+            if not rows:
+                return
+            # Attached requests resolve to their primary, so they go with it
+            expired_ids = {row["id"] for row in rows}
+            aliases = await database.fetch_all(scan_sessions_table.select().where(sessions.alias_of.in_(expired_ids)))
+            rows += [dict(row) for row in aliases if row["id"] not in expired_ids]
+            await self.purge_sessions(rows)
+            report["expired_sessions"] += len(rows)
+            await self.renew(holder)
+
+    async def enforce_archive_size(self, report: Dict, holder: str):
+        """Purge the oldest archived sessions until archives fit in ARCHIVE_MAX_BYTES"""
+        if ARCHIVE_MAX_BYTES <= 0:
+            return
+        sessions = scan_sessions_table.c
+        rows = await database.fetch_all(
+            sqlalchemy.select(sessions.id, sessions.log_archive, sessions.output_file)
+            .where(sessions.archived_at.isnot(None))
+            .order_by(sqlalchemy.func.coalesce(sessions.completed_at, sessions.created_at))
+        )
+        archived = [dict(row) for row in rows]
+        sizes = await asyncio.to_thread(lambda: [(session, files_size(session_files(session))) for session in archived])
+        total = sum(size for _, size in sizes)
+        expired = []
+        for session, size in sizes:
+            if total <= ARCHIVE_MAX_BYTES:
+                break
+            expired.append(session)
+            total -= size
+        for start in range(0, len(expired), 100):
+            await self.purge_sessions(expired[start:start + 100])
+            await self.renew(holder)
+        report["purged_sessions"] = len(expired)
+        report["archive_bytes"] = total
+
+    async def expire_status_checks(self, report: Dict):
+        if STATUS_CHECK_RETENTION_DAYS <= 0:
+            return
+        cutoff = datetime.utcnow() - timedelta(days=STATUS_CHECK_RETENTION_DAYS)
+        report["deleted_status_checks"] = await delete_in_batches(
+            status_checks_table, status_checks_table.c.timestamp < cutoff
+        )
+
+    async def compact(self, report: Dict, rebuild: bool = False):
+        """Return free pages to the filesystem a slice at a time and refresh planner statistics"""
+        auto_vacuum = (await database.fetch_one("PRAGMA auto_vacuum"))[0]
+        free_pages = (await database.fetch_one("PRAGMA freelist_count"))[0]
+        if auto_vacuum == 2:
+            async with database.connection() as connection:
+                # A plain execute frees a single page; a script steps the pragma to completion
+                await connection.raw_connection.executescript(f"PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES})")
+            report["vacuumed_pages"] = min(free_pages, MAINTENANCE_VACUUM_PAGES)
+        elif rebuild:
+            # Holds the write lock for the whole rebuild and needs free disk about the size of the file
+            async with database.connection() as connection:
+                await connection.raw_connection.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+            report["rebuilt"] = True
+        else:
+            # Created before incremental vacuum was enabled; free pages are reused but not returned
+            report["rebuild_pending"] = True
+        await database.execute("PRAGMA optimize")  # ANALYZE for tables whose statistics drifted
+        await database.fetch_all("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    async def storage(self) -> Dict:
+        auto_vacuum = (await database.fetch_one("PRAGMA auto_vacuum"))[0]
+        return {
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(auto_vacuum, str(auto_vacuum)),
+            "rebuild_pending": auto_vacuum != 2,
+            "free_pages": (await database.fetch_one("PRAGMA freelist_count"))[0],
+        }
+
+maintenance = MaintenanceJob()
+
+# Export
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+RESULT_EXPORT_COLUMNS = ["session_id", "model_name", "environment", "tool", "probe", "detector",
+                         "passed", "total", "created_at", "completed_at"]
+ATTEMPT_EXPORT_COLUMNS = ["session_id", "model_name", "probe", "attempt_id", "seq", "status",
+                          "prompt", "outputs", "detector_results"]
+EXPORT_INTEGER_COLUMNS = {"passed", "total", "seq", "status"}
+
+class ExportSink:
+    """Write-only file object that hands written bytes back to the stream"""
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_sessions_query(session_ids: Optional[List[str]], models: Optional[List[str]],
+                          since: Optional[datetime], until: Optional[datetime]):
+    """Build the session filter shared by all export row types"""
+    since, until = naive_utc(since), naive_utc(until)
+    query = scan_sessions_table.select()
+    if session_ids:
+        query = query.where(scan_sessions_table.c.id.in_(session_ids))
+    if models:
+        query = query.where(scan_sessions_table.c.model_name.in_(models))
+    if since:
+        query = query.where(scan_sessions_table.c.created_at >= since)
+    if until:
+        query = query.where(scan_sessions_table.c.created_at < until)
+    return query
+
+# Rows are read in keyset-paginated pages rather than through one long-lived cursor,
+# so a slow export client never holds a read lock that blocks running scans.
+async def iterate_sessions(sessions_query):
+    last_id = ""
+    while True:
+        page = await database.fetch_all(
+            sessions_query.where(scan_sessions_table.c.id > last_id)
+            .order_by(scan_sessions_table.c.id).limit(EXPORT_BATCH_SIZE)
+        )
+        for session in page:
+            yield session
+        if len(page) < EXPORT_BATCH_SIZE:
+            break
+        last_id = page[-1]["id"]
+
+async def iterate_result_rows(sessions_query, probes: Optional[List[str]]):
+    """Yield stored probe/detector results joined with their session"""
+    sessions = sessions_query.subquery()
+    query = sqlalchemy.select(
+        scan_results_table.c.id,
+        scan_results_table.c.session_id,
+        sessions.c.model_name,
+        sessions.c.environment,
+        sessions.c.tool,
+        scan_results_table.c.probe,
+        scan_results_table.c.detector,
+        scan_results_table.c.passed,
+        scan_results_table.c.total,
+        sessions.c.created_at,
+        sessions.c.completed_at,
+    ).select_from(
+        scan_results_table.join(sessions, scan_results_table.c.session_id == sessions.c.id)
+    )
+    if probes:
+        query = query.where(scan_results_table.c.probe.in_(probes))
+    last_id = 0
+    while True:
+        page = await database.fetch_all(
+            query.where(scan_results_table.c.id > last_id)
+            .order_by(scan_results_table.c.id).limit(EXPORT_BATCH_SIZE)
+        )
+        for row in page:
+            yield dict(row)
+        if len(page) < EXPORT_BATCH_SIZE:
+            break
+        last_id = page[-1]["id"]
+
+def read_report_lines(report_file, limit: int) -> List[str]:
+    lines = []
+    for _ in range(limit):
+        line = report_file.readline()
+        if not line:
+            break
+        lines.append(line)
+    return lines
+
+def flatten_value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+async def iterate_report_lines(report_path: str):
+    """Yield batches of lines from a garak report, plain or archived"""
+    if archive_codec(report_path):
+        async for lines in iterate_archive(report_path):
+            yield lines
+        return
+    report_file = await asyncio.to_thread(open, report_path, "r", encoding="utf-8", errors="replace")
+    try:
+        while True:
+            lines = await asyncio.to_thread(read_report_lines, report_file, EXPORT_BATCH_SIZE)
+            if not lines:
+                break
+            yield lines
+    finally:
+        report_file.close()
+
+async def iterate_attempt_rows(sessions_query, probes: Optional[List[str]]):
+    """Yield attempt entries from each session's garak report file"""
+    async for session in iterate_sessions(sessions_query):
+        report_path = session["output_file"]
+        if not report_path or not os.path.exists(report_path):
+            continue
+        async for lines in iterate_report_lines(report_path):
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("entry_type") != "attempt":
+                    continue
+                probe = entry.get("probe_classname")
+                if probes and probe not in probes:
+                    continue
+                yield {
+                    "session_id": session["id"],
+                    "model_name": session["model_name"],
+                    "probe": probe,
+                    "attempt_id": entry.get("uuid"),
+                    "seq": entry.get("seq"),
+                    "status": entry.get("status"),
+                    "prompt": flatten_value(entry.get("prompt")),
+                    "outputs": flatten_value(entry.get("outputs")),
+                    "detector_results": flatten_value(entry.get("detector_results")),
+                }
+
+async def batch_rows(rows, size: int = EXPORT_BATCH_SIZE):
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def encode_csv(batches, columns: List[str]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for batch in batches:
+        writer.writerows([[export_cell(row[column]) for column in columns] for row in batch])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+async def encode_jsonl(batches, columns: List[str]):
+    async for batch in batches:
+        yield "".join(
+            json.dumps({column: export_cell(row[column]) for column in columns}, ensure_ascii=False) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+async def encode_parquet(batches, columns: List[str]):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (column, pa.int64() if column in EXPORT_INTEGER_COLUMNS else pa.string()) for column in columns
+    ])
+    sink = ExportSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for batch in batches:
+            table = pa.Table.from_pylist(
+                [{column: export_cell(row[column]) for column in columns} for row in batch], schema=schema
+            )
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+async def gzip_stream(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -402,25 +2233,42 @@ async def create_scan(scan_request: ScanRequest):
             model_name=scan_request.model_name,
             probes=scan_request.probes,
             tool=scan_request.tool,
-            promptmap_directory=scan_request.promptmap_directory
+            promptmap_directory=scan_request.promptmap_directory,
+            client_name=scan_request.client_name,
+            estimated_work=estimate_scan_work(scan_request.tool, scan_request.model_name, scan_request.probes)
         )
 
-        # Save session to database
-        query = scan_sessions_table.insert().values(
-            id=session.id,
-            environment=session.environment,
-            model_name=session.model_name,
-            probes=json.dumps(session.probes),
-            tool=session.tool,
-            status=session.status,
-            created_at=session.created_at,
-            completed_at=session.completed_at,
-            output_file=session.output_file,
-            error_message=session.error_message,
-            promptmap_directory=session.promptmap_directory
-        )
-        await database.execute(query)
+        # The asyncio lock queues this worker's submissions; the transaction serializes workers
+        async with admission.lock, immediate_transaction():
+            primary = await find_identical_scan(session) if scan_request.dedupe else None
+            if primary:
+                # Attached requests share the primary's run, so they bypass admission
+                session.alias_of = primary["id"]
+                session.status = primary["status"]
+            else:
+                await admission.check(session.model_name, session.client_name, session.estimated_work)
+
+            # Save session to database
+            query = scan_sessions_table.insert().values(
+                id=session.id,
+                environment=session.environment,
+                model_name=session.model_name,
+                probes=json.dumps(session.probes),
+                tool=session.tool,
+                status=session.status,
+                created_at=session.created_at,
+                completed_at=session.completed_at,
+                output_file=session.output_file,
+                error_message=session.error_message,
+                promptmap_directory=session.promptmap_directory,
+                client_name=session.client_name,
+                estimated_work=session.estimated_work,
+                alias_of=session.alias_of
+            )
+            await database.execute(query)
 
+        if session.alias_of:
+            return {"session_id": session.id, "status": "attached", "alias_of": session.alias_of}
         return {"session_id": session.id, "status": "created"}
 
     except HTTPException:
@@ -429,10 +2277,39 @@ async def create_scan(scan_request: ScanRequest):
         print(f"❌ Error in create_scan: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/scan/capacity")
+async def get_scan_capacity(client_name: Optional[str] = None):
+    """Get current scan queue usage against admission limits"""
+    snapshot = await admission.snapshot()
+    capacity = {
+        "sessions": snapshot["sessions"],
+        "max_sessions": ADMISSION_MAX_SESSIONS,
+        "work": snapshot["work"],
+        "max_work": ADMISSION_MAX_WORK,
+        "max_work_per_model": ADMISSION_MAX_WORK_PER_MODEL,
+        "models": snapshot["models"],
+        "accepting": snapshot["sessions"] < ADMISSION_MAX_SESSIONS and snapshot["work"] < ADMISSION_MAX_WORK,
+    }
+    if client_name:
+        capacity["client"] = {
+            "client_name": client_name,
+            "sessions": snapshot["clients"].get(client_name, 0),
+            "quota": admission.client_quota(client_name),
+        }
+    return capacity
+
 @api_router.websocket("/ws/scan/{session_id}")
-async def websocket_scan(websocket: WebSocket, session_id: str):
-    """WebSocket endpoint for real-time scan execution"""
+async def websocket_scan(websocket: WebSocket, session_id: str, after: int = 0, format: str = "text"):
+    """WebSocket endpoint for real-time scan output, served by any API worker
+
+    Clients may resume from an event id with ``after``; ``format=json`` sends
+    ``{"id", "text"}`` frames so clients can page older lines from /logs.
+    """
     await manager.connect(websocket)
+    subscription = None
+    listener = None
+    connection_span = None
+    send_span = None
     try:
         # Get session from database
         query = scan_sessions_table.select().where(scan_sessions_table.c.id == session_id)
@@ -443,60 +2320,336 @@ async def websocket_scan(websocket: WebSocket, session_id: str):
             return
 
         session_dict = dict(result)
-        session_dict['probes'] = json.loads(session_dict['probes'])
-
-        # Update session status
-        update_query = scan_sessions_table.update().where(
-            scan_sessions_table.c.id == session_id
-        ).values(status="running")
-        await database.execute(update_query)
-
-        # Run the scan based on tool type
-        if session_dict["tool"] == "garak":
-            success, error = await run_garak_scan(
-                session_dict["environment"],
-                session_dict["model_name"],
-                session_dict["probes"],
-                websocket
-            )
-        elif session_dict["tool"] == "promptmap":
-            success, error = await run_promptmap_scan(
-                session_dict["environment"],
-                session_dict["model_name"],
-                session_dict["promptmap_directory"],
-                websocket
+        if session_dict["alias_of"]:
+            primary = await database.fetch_one(
+                scan_sessions_table.select().where(scan_sessions_table.c.id == session_dict["alias_of"])
             )
-        else:
-            success, error = False, f"Unknown tool: {session_dict['tool']}"
-
-        # Update session status
-        status = "completed" if success else "failed"
-        update_values = {
-            "status": status,
-            "completed_at": datetime.utcnow()
-        }
-        if error:
-            update_values["error_message"] = error
+            if not primary or (session_dict["status"] in ("completed", "failed") and primary["status"] in ("pending", "running")):
+                # Detached from the shared scan, which runs on for the other requests
+                await websocket.close()
+                return
+            # Follow the shared scan's stream
+            session_dict = dict(primary)
+        elif session_dict["detached_at"]:
+            # This request left the scan it started, which runs on for the attached requests
+            await websocket.close()
+            return
+        stream_id = session_dict["id"]
+        connection_span = tracer.start(stream_id, "websocket.connection", "websocket", status=session_dict["status"], requested=session_id)
+        if session_dict["archived_at"]:
+            # The event log was archived; replay it from the archive and finish
+            if session_dict["log_archive"]:
+                async for lines in iterate_archive(session_dict["log_archive"], after + 1):
+                    for line in lines:
+                        entry = json.loads(line)
+                        if entry["id"] <= after:
+                            continue
+                        message = line if format == "json" else entry["text"]
+                        await manager.send_personal_message(message, websocket)
+            await websocket.close()
+            return
+        if session_dict["status"] == "pending":
+            await claim_scan(session_dict)
+        elif session_dict["status"] in ("completed", "failed") and not await has_end_event(stream_id):
+            await bus.publish(stream_id, session_dict["status"], kind="end")
 
-        update_query = scan_sessions_table.update().where(
-            scan_sessions_table.c.id == session_id
-        ).values(**update_values)
-        await database.execute(update_query)
+        # Follow the session's event log, wherever the scan is running
+        subscription = bus.subscribe(stream_id, after)
+        listener = asyncio.create_task(listen_for_commands(websocket, session_id, stream_id))
+        while True:
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({getter, listener}, timeout=HEARTBEAT_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                if listener in done:
+                    break
+                await reap_stale_scan(stream_id)
+                continue
+            events = [getter.result()] + subscription.drain()
+            finished = False
+            send_span = tracer.start(stream_id, "websocket.send", "websocket", events=len(events))
+            for event in events:
+                if event["kind"] == "end":
+                    finished = True
+                    break
+                if event["kind"] == "detach" and session_id == stream_id:
+                    # The requester left the shared scan; attached requests keep following it
+                    await manager.send_personal_message("🛑 Detached from the shared scan", websocket)
+                    finished = True
+                    break
+                if event["kind"] == "output":
+                    if format == "json":
+                        message = json.dumps({"id": event["id"], "text": event["payload"]}, ensure_ascii=False)
+                    else:
+                        message = event["payload"]
+                    await manager.send_personal_message(message, websocket)
+            tracer.end(send_span)
+            if finished:
+                await websocket.close()
+                break
 
     except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        try:
+            await manager.send_personal_message(f"❌ Error: {str(e)}", websocket)
+        except Exception:
+            pass
+    finally:
+        if listener:
+            listener.cancel()
+        if subscription:
+            bus.unsubscribe(subscription)
+        if send_span:
+            tracer.end(send_span)
+        if connection_span:
+            tracer.end(connection_span)
         manager.disconnect(websocket)
-        # Update session status to failed
+
+async def cancel_run(session: Dict) -> Dict:
+    """Stop a primary session's scan, whichever worker owns it"""
+    session_id = session["id"]
+    query = scan_sessions_table.select().where(scan_sessions_table.c.id == session_id)
+
+    # Pending sessions have no owner yet, so they are cancelled in place
+    if session["status"] == "pending":
         update_query = scan_sessions_table.update().where(
-            scan_sessions_table.c.id == session_id
-        ).values(status="failed", error_message="WebSocket disconnected")
+            scan_sessions_table.c.id == session_id,
+            scan_sessions_table.c.status == "pending"
+        ).values(status="failed", error_message="Cancelled", completed_at=datetime.utcnow())
         await database.execute(update_query)
-    except Exception as e:
-        await manager.send_personal_message(f"❌ Error: {str(e)}", websocket)
-        # Update session status to failed
+        session = await database.fetch_one(query)
+        if session["status"] == "failed":
+            await update_aliases(session_id, status="failed", error_message="Cancelled", completed_at=session["completed_at"])
+            await bus.publish(session_id, "failed", kind="end")
+            return {"session_id": session_id, "status": "failed"}
+
+    if session["status"] == "running":
+        await bus.publish(session_id, "cancel", kind="command")
+        return {"session_id": session_id, "status": "cancelling"}
+
+    return {"session_id": session_id, "status": session["status"]}
+
+@api_router.post("/scan/{session_id}/cancel")
+async def cancel_scan(session_id: str):
+    """Cancel a pending or running scan, whichever worker owns it
+
+    A shared scan keeps running while other attached requests are waiting on it;
+    only the cancelling request is detached.
+    """
+    query = scan_sessions_table.select().where(scan_sessions_table.c.id == session_id)
+    result = await database.fetch_one(query)
+    if not result:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if result["alias_of"]:
         update_query = scan_sessions_table.update().where(
-            scan_sessions_table.c.id == session_id
-        ).values(status="failed", error_message=str(e))
+            scan_sessions_table.c.id == session_id,
+            scan_sessions_table.c.status.in_(["pending", "running"])
+        ).values(status="failed", error_message="Cancelled", completed_at=datetime.utcnow())
         await database.execute(update_query)
+        primary = await database.fetch_one(
+            scan_sessions_table.select().where(scan_sessions_table.c.id == result["alias_of"])
+        )
+        if primary and primary["detached_at"] and primary["status"] in ("pending", "running") \
+                and not await live_aliases(primary["id"]):
+            # The last request waiting on a detached scan left, so nobody needs it
+            await cancel_run(dict(primary))
+        return {"session_id": session_id, "status": "detached"}
+
+    if result["status"] in ("pending", "running"):
+        if result["detached_at"] or await detach_primary(session_id):
+            return {"session_id": session_id, "status": "detached"}
+    return await cancel_run(dict(result))
+
+@api_router.get("/scan/{session_id}/logs")
+async def get_scan_logs(session_id: str, before: Optional[int] = None, limit: int = 500):
+    """Get a page of a session's output lines, the latest page unless paging back with ``before``"""
+    limit = min(max(limit, 1), 5000)
+    session_id = await resolve_session_id(session_id)
+    session = await database.fetch_one(
+        sqlalchemy.select(scan_sessions_table.c.log_archive).where(scan_sessions_table.c.id == session_id)
+    )
+    if session and session["log_archive"]:
+        lines, has_more = await read_archived_log_page(session["log_archive"], before, limit)
+        return {"session_id": session_id, "lines": lines, "has_more": has_more}
+    query = sqlalchemy.select(scan_events_table.c.id, scan_events_table.c.payload).where(
+        scan_events_table.c.session_id == session_id,
+        scan_events_table.c.kind == "output"
+    )
+    if before is not None:
+        query = query.where(scan_events_table.c.id < before)
+    rows = await database.fetch_all(query.order_by(scan_events_table.c.id.desc()).limit(limit + 1))
+    lines = [{"id": row["id"], "text": row["payload"]} for row in rows[:limit]]
+    lines.reverse()
+    return {"session_id": session_id, "lines": lines, "has_more": len(rows) > limit}
+
+@api_router.get("/scan/{session_id}/trace")
+async def export_scan_trace(session_id: str):
+    """Export a session's spans as a Chrome trace-event JSON file"""
+    session_id = await resolve_session_id(session_id)
+    query = scan_sessions_table.select().where(scan_sessions_table.c.id == session_id)
+    session = await database.fetch_one(query)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    await tracer.flush()
+    query = scan_spans_table.select().where(scan_spans_table.c.session_id == session_id).order_by(scan_spans_table.c.ts)
+    rows = await database.fetch_all(query)
+
+    events = []
+    named_threads = set()
+    for row in rows:
+        tid = TRACE_TRACKS.get(row["track"], 0)
+        if (row["pid"], None) not in named_threads:
+            named_threads.add((row["pid"], None))
+            events.append({"name": "process_name", "ph": "M", "pid": row["pid"], "args": {"name": f"worker {row['worker_id']}"}})
+        if (row["pid"], tid) not in named_threads:
+            named_threads.add((row["pid"], tid))
+            events.append({"name": "thread_name", "ph": "M", "pid": row["pid"], "tid": tid, "args": {"name": row["track"]}})
+        event = {
+            "name": row["name"],
+            "cat": row["track"],
+            "ph": row["phase"],
+            "ts": row["ts"],
+            "pid": row["pid"],
+            "tid": tid,
+            "args": json.loads(row["args"] or "{}"),
+        }
+        if row["phase"] == "X":
+            event["dur"] = row["dur"]
+        else:
+            event["s"] = "t"
+        events.append(event)
+
+    trace = {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "session_id": session_id,
+            "tool": session["tool"],
+            "model_name": session["model_name"],
+            "status": session["status"],
+        },
+    }
+    return JSONResponse(trace, headers={"Content-Disposition": f'attachment; filename="scan_{session_id}.trace.json"'})
+
+@api_router.get("/scan/{session_id}/results")
+async def get_scan_results(session_id: str):
+    """Get parsed probe/detector results for a session"""
+    query = scan_results_table.select().where(scan_results_table.c.session_id == await resolve_session_id(session_id))
+    rows = await database.fetch_all(query)
+    results = []
+    for row in rows:
+        row_dict = dict(row)
+        row_dict["pass_rate"] = row_dict["passed"] / row_dict["total"] if row_dict["total"] else None
+        results.append(row_dict)
+    return {"session_id": session_id, "results": results}
+
+@api_router.get("/analytics/compare")
+async def compare_scans(
+    baseline_sessions: Optional[List[str]] = Query(None),
+    candidate_sessions: Optional[List[str]] = Query(None),
+    model_name: Optional[str] = None,
+    baseline_model: Optional[str] = None,
+    candidate_model: Optional[str] = None,
+    baseline_since: Optional[datetime] = None,
+    baseline_until: Optional[datetime] = None,
+    candidate_since: Optional[datetime] = None,
+    candidate_until: Optional[datetime] = None,
+    probe: Optional[str] = None,
+    alpha: float = 0.05
+):
+    """Compare pass rates per probe/detector between a baseline and a candidate set of sessions"""
+    baseline_model = baseline_model or model_name
+    candidate_model = candidate_model or model_name
+    if not (baseline_sessions or baseline_model or baseline_since or baseline_until):
+        raise HTTPException(status_code=422, detail="Baseline selection is required")
+    if not (candidate_sessions or candidate_model or candidate_since or candidate_until):
+        raise HTTPException(status_code=422, detail="Candidate selection is required")
+    if not 0 < alpha < 1:
+        raise HTTPException(status_code=422, detail="alpha must be between 0 and 1")
+
+    baseline_sessions = await resolve_session_ids(baseline_sessions)
+    candidate_sessions = await resolve_session_ids(candidate_sessions)
+    frame = await analytics_cache.get_frame()
+    baseline = select_results(frame, baseline_sessions, baseline_model, baseline_since, baseline_until, probe)
+    candidate = select_results(frame, candidate_sessions, candidate_model, candidate_since, candidate_until, probe)
+    comparison = compare_results(baseline, candidate, alpha)
+    return {
+        "baseline_sessions": int(baseline["session_id"].nunique()),
+        "candidate_sessions": int(candidate["session_id"].nunique()),
+        "regressions": int((comparison["change"] == "regression").sum()),
+        "improvements": int((comparison["change"] == "improvement").sum()),
+        "results": frame_to_records(comparison),
+    }
+
+@api_router.get("/analytics/trends")
+async def get_trends(
+    model_name: Optional[str] = None,
+    probe: Optional[str] = None,
+    detector: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bucket: str = "day"
+):
+    """Get pass-rate trend series per probe/detector across sessions"""
+    if bucket != "session" and bucket not in TREND_BUCKETS:
+        raise HTTPException(status_code=422, detail=f"Unknown bucket: {bucket}")
+
+    frame = select_results(await analytics_cache.get_frame(), None, model_name, since, until, probe, detector)
+    trends = trend_results(frame, bucket)
+    columns = ["bucket", "passed", "total", "sessions", "pass_rate"]
+    if bucket == "session":
+        columns.insert(1, "session_id")
+    series = []
+    for (probe_name, detector_name), points in trends.groupby(["probe", "detector"], sort=False):
+        series.append({
+            "probe": probe_name,
+            "detector": detector_name,
+            "points": frame_to_records(points[columns]),
+        })
+    return {"sessions": int(frame["session_id"].nunique()), "series": series}
+
+@api_router.get("/scans/export")
+async def export_scans(
+    session_ids: Optional[List[str]] = Query(None),
+    models: Optional[List[str]] = Query(None),
+    probes: Optional[List[str]] = Query(None),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = "jsonl",
+    rows: str = "results",
+    gzip: bool = False
+):
+    """Stream scan results or garak attempts as CSV, JSONL or Parquet"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=422, detail=f"Unknown format: {format}")
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    if rows == "results":
+        columns, row_source = RESULT_EXPORT_COLUMNS, iterate_result_rows
+    elif rows == "attempts":
+        columns, row_source = ATTEMPT_EXPORT_COLUMNS, iterate_attempt_rows
+    else:
+        raise HTTPException(status_code=422, detail=f"Unknown rows: {rows}")
+
+    session_ids = await resolve_session_ids(session_ids)
+    batches = batch_rows(row_source(export_sessions_query(session_ids, models, since, until), probes))
+    encoder = {"csv": encode_csv, "jsonl": encode_jsonl, "parquet": encode_parquet}[format]
+    stream = encoder(batches, columns)
+    filename = f"scan_{rows}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{format}"
+    media_type = EXPORT_FORMATS[format]
+    if gzip:
+        stream = gzip_stream(stream)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
@@ -515,6 +2668,30 @@ async def get_status_checks():
     results = await database.fetch_all(query)
     return [StatusCheck(**dict(row)) for row in results]
 
+@api_router.get("/maintenance")
+async def get_maintenance():
+    """Retention policy and the last maintenance pass run by this worker"""
+    lease = await database.fetch_one(
+        maintenance_leases_table.select().where(maintenance_leases_table.c.name == "maintenance")
+    )
+    return {
+        "policy": maintenance.policy(),
+        "storage": await maintenance.storage(),
+        "last_finished_at": lease["finished_at"].isoformat() if lease and lease["finished_at"] else None,
+        "last_report": maintenance.last_report,
+    }
+
+@api_router.post("/maintenance/run")
+async def run_maintenance(rebuild: bool = False):
+    """Run a maintenance pass now: archive, enforce retention and compact
+
+    ``rebuild=true`` converts a database without incremental vacuum with one full VACUUM.
+    """
+    report = await maintenance.run(force=True, rebuild=rebuild)
+    if report is None:
+        raise HTTPException(status_code=409, detail="A maintenance pass is already running on another worker")
+    return report
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -526,13 +2703,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Health endpoints, outside the /api prefix for orchestrator probes
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok", "worker_id": WORKER_ID}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the subsystems needed to serve scans are initialized"""
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+async def warm_up(name: str, loader):
+    try:
+        await loader()
+        readiness.mark_ready(name)
+    except Exception as e:
+        readiness.mark_failed(name, str(e))
+
+async def initialize():
+    """Bring subsystems up in the background so the server accepts connections immediately"""
+    try:
+        await asyncio.to_thread(migrate_schema)
+        readiness.mark_ready("database")
+        await bus.start()
+        tracer.start_flushing()
+        maintenance.start()
+        readiness.mark_ready("event_bus")
+    except Exception as e:
+        readiness.mark_failed("database" if readiness.subsystems["database"] != "ready" else "event_bus", str(e))
+    await asyncio.gather(
+        warm_up("environments", environment_cache.refresh),
+        warm_up("models", model_cache.refresh),
+        warm_up("analytics", lambda: asyncio.to_thread(importlib.import_module, "pandas")),
+    )
+
+initialize_task: Optional[asyncio.Task] = None
+
 # Database connection events
 @app.on_event("startup")
 async def startup():
+    global initialize_task
     await database.connect()
+    initialize_task = asyncio.create_task(initialize())
 
 @app.on_event("shutdown")
 async def shutdown():
+    if initialize_task:
+        initialize_task.cancel()
+        await asyncio.gather(initialize_task, return_exceptions=True)
+    for task in list(running_scans.values()):
+        task.cancel()
+    await asyncio.gather(*running_scans.values(), return_exceptions=True)
+    await maintenance.stop()
+    await bus.stop()
+    await tracer.stop()
     await database.disconnect()
 
 # Configure logging
@@ -544,4 +2770,5 @@ logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # Any number of workers can serve the API; scans and commands are routed through the event bus
+    uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=int(os.environ.get("WEB_CONCURRENCY", "1")))
\ No newline at end of file
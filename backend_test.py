@@ -67,6 +67,17 @@ class LLMVulnerabilityScannerTester:
         else:
             return self.log_test("Health Check", False, f"- Status: {status}, Data: {data}")
 
+    def test_health_endpoints(self):
+        """Test GET /healthz and /readyz endpoints"""
+        success, data, status = self.make_request('GET', f"{self.base_url}/healthz")
+        self.log_test("Liveness Check", success and data.get('status') == 'ok', f"- Status: {status}")
+
+        success, data, status = self.make_request('GET', f"{self.base_url}/readyz")
+        if success and data.get('ready') is True:
+            return self.log_test("Readiness Check", True, f"- Startup: {data.get('startup_seconds')}s, Subsystems: {data.get('subsystems')}")
+        else:
+            return self.log_test("Readiness Check", False, f"- Status: {status}, Data: {data}")
+
     def test_get_environments(self):
         """Test GET /api/environments endpoint"""
         success, data, status = self.make_request('GET', 'environments')
@@ -200,6 +211,103 @@ class LLMVulnerabilityScannerTester:
         else:
             return self.log_test("Get Status Checks", False, f"- Status: {status}, Data: {data}")
 
+    def test_cancel_scan(self):
+        """Test POST /api/scan/{session_id}/cancel endpoint on a pending session"""
+        scan_data = {
+            "environment": "test_env",
+            "model_name": "test_model",
+            "probes": ["test.Test"],
+            "tool": "garak",
+            "dedupe": False
+        }
+        success, data, status = self.make_request('POST', 'scan', scan_data, 200)
+        if not success or 'session_id' not in data:
+            return self.log_test("Cancel Pending Scan", False, f"- Could not create session: {data}")
+
+        success, data, status = self.make_request('POST', f"scan/{data['session_id']}/cancel", {}, 200)
+        if success and data.get('status') == 'failed':
+            return self.log_test("Cancel Pending Scan", True, f"- Status: {data.get('status')}")
+        else:
+            return self.log_test("Cancel Pending Scan", False, f"- Status: {status}, Data: {data}")
+
+    def test_scan_dedupe(self):
+        """Test that an identical scan attaches to the pending one instead of starting another"""
+        scan_data = {
+            "environment": "test_env",
+            "model_name": "test_model",
+            "probes": ["test.Dedupe"],
+            "tool": "garak"
+        }
+        success, first, status = self.make_request('POST', 'scan', scan_data, 200)
+        if not success or 'session_id' not in first:
+            return self.log_test("Scan Deduplication", False, f"- Could not create session: {first}")
+
+        success, second, status = self.make_request('POST', 'scan', scan_data, 200)
+        self.make_request('POST', f"scan/{first['session_id']}/cancel", {}, 200)
+        if success and second.get('status') == 'attached' and second.get('alias_of') == first['session_id']:
+            return self.log_test("Scan Deduplication", True, f"- Attached to: {second['alias_of']}")
+        else:
+            return self.log_test("Scan Deduplication", False, f"- Status: {status}, Data: {second}")
+
+    def test_cancel_shared_scan(self):
+        """Test that cancelling a primary scan with an attached request only detaches its requester"""
+        scan_data = {
+            "environment": "test_env",
+            "model_name": "test_model",
+            "probes": ["test.SharedCancel"],
+            "tool": "garak"
+        }
+        success, primary, status = self.make_request('POST', 'scan', {**scan_data, "client_name": "alice"}, 200)
+        if not success or 'session_id' not in primary:
+            return self.log_test("Cancel Shared Scan", False, f"- Could not create session: {primary}")
+        success, alias, status = self.make_request('POST', 'scan', {**scan_data, "client_name": "bob"}, 200)
+        if not success or alias.get('alias_of') != primary['session_id']:
+            return self.log_test("Cancel Shared Scan", False, f"- Request was not attached: {alias}")
+
+        success, cancelled, status = self.make_request('POST', f"scan/{primary['session_id']}/cancel", {}, 200)
+        _, capacity, _ = self.make_request('GET', 'scan/capacity?client_name=bob')
+        # Once the last attached request leaves, the shared scan itself is cancelled
+        self.make_request('POST', f"scan/{alias['session_id']}/cancel", {}, 200)
+        _, final, _ = self.make_request('POST', f"scan/{primary['session_id']}/cancel", {}, 200)
+        if success and cancelled.get('status') == 'detached' and capacity.get('client', {}).get('sessions') == 1 \
+                and final.get('status') == 'failed':
+            return self.log_test("Cancel Shared Scan", True, "- Primary requester detached, scan kept for attached request")
+        else:
+            return self.log_test("Cancel Shared Scan", False, f"- Cancel: {cancelled}, Capacity: {capacity}, Final: {final}")
+
+    def test_scan_capacity(self):
+        """Test GET /api/scan/capacity endpoint"""
+        success, data, status = self.make_request('GET', 'scan/capacity?client_name=backend_test')
+        if success and 'max_sessions' in data and 'client' in data:
+            return self.log_test("Scan Capacity", True, f"- Sessions: {data['sessions']}/{data['max_sessions']}, Work: {data['work']}")
+        else:
+            return self.log_test("Scan Capacity", False, f"- Status: {status}, Data: {data}")
+
+    def test_analytics(self):
+        """Test GET /api/analytics/compare and /api/analytics/trends endpoints"""
+        success, data, status = self.make_request('GET', 'analytics/compare?model_name=test_model')
+        if success and 'results' in data and isinstance(data['results'], list):
+            self.log_test("Analytics Compare", True, f"- Regressions: {data.get('regressions')}")
+        else:
+            self.log_test("Analytics Compare", False, f"- Status: {status}, Data: {data}")
+
+        success, data, status = self.make_request('GET', 'analytics/trends?bucket=week')
+        if success and 'series' in data and isinstance(data['series'], list):
+            return self.log_test("Analytics Trends", True, f"- Found {len(data['series'])} series")
+        else:
+            return self.log_test("Analytics Trends", False, f"- Status: {status}, Data: {data}")
+
+    def test_export(self):
+        """Test GET /api/scans/export endpoint"""
+        try:
+            response = requests.get(f"{self.api_url}/scans/export", params={"format": "csv"}, timeout=10)
+            header = response.text.splitlines()[0] if response.text else ""
+            if response.status_code == 200 and header.startswith("session_id"):
+                return self.log_test("Export Results CSV", True, f"- Header: {header}")
+            return self.log_test("Export Results CSV", False, f"- Status: {response.status_code}")
+        except Exception as e:
+            return self.log_test("Export Results CSV", False, f"- Error: {str(e)}")
+
     def on_websocket_message(self, ws, message):
         """WebSocket message handler"""
         self.websocket_messages.append(message)
@@ -246,6 +354,70 @@ class LLMVulnerabilityScannerTester:
         except Exception as e:
             return self.log_test("WebSocket Connection", False, f"- Error: {str(e)}")
 
+    def test_scan_logs(self):
+        """Test GET /api/scan/{session_id}/logs endpoint"""
+        if not self.session_id:
+            return self.log_test("Scan Logs", False, "- No session ID available")
+
+        success, data, status = self.make_request('GET', f"scan/{self.session_id}/logs?limit=50")
+        if success and isinstance(data.get('lines'), list) and 'has_more' in data:
+            return self.log_test("Scan Logs", True, f"- Found {len(data['lines'])} lines")
+        else:
+            return self.log_test("Scan Logs", False, f"- Status: {status}, Data: {data}")
+
+    def test_scan_trace(self):
+        """Test GET /api/scan/{session_id}/trace endpoint"""
+        if not self.session_id:
+            return self.log_test("Scan Trace Export", False, "- No session ID available")
+
+        success, data, status = self.make_request('GET', f"scan/{self.session_id}/trace")
+        if success and isinstance(data.get('traceEvents'), list):
+            return self.log_test("Scan Trace Export", True, f"- Found {len(data['traceEvents'])} trace events")
+        else:
+            return self.log_test("Scan Trace Export", False, f"- Status: {status}, Data: {data}")
+
+    def test_maintenance(self):
+        """Test POST /api/maintenance/run endpoint"""
+        success, data, status = self.make_request('POST', 'maintenance/run')
+        if success and 'archived_sessions' in data:
+            return self.log_test("Maintenance Pass", True, f"- Archived {data['archived_sessions']}, expired {data['expired_sessions']} sessions")
+        elif status == 409:
+            return self.log_test("Maintenance Pass", True, "- Pass already running on another worker")
+        else:
+            return self.log_test("Maintenance Pass", False, f"- Status: {status}, Data: {data}")
+
+    def test_scan_after_maintenance(self):
+        """Test that a scan started after a maintenance pass still streams its output"""
+        scan_data = {
+            "environment": "test_env",
+            "model_name": "test_model",
+            "probes": ["test.AfterMaintenance"],
+            "tool": "garak",
+            "dedupe": False
+        }
+        self.make_request('POST', 'maintenance/run')
+        success, data, status = self.make_request('POST', 'scan', scan_data, 200)
+        if not success or 'session_id' not in data:
+            return self.log_test("Scan After Maintenance", False, f"- Could not create session: {data}")
+
+        messages = []
+        try:
+            ws_url = f"{self.base_url.replace('http', 'ws')}/api/ws/scan/{data['session_id']}"
+            ws = websocket.WebSocketApp(ws_url, on_message=lambda ws, message: messages.append(message))
+            wst = threading.Thread(target=ws.run_forever)
+            wst.daemon = True
+            wst.start()
+            time.sleep(5)
+            ws.close()
+        except Exception as e:
+            return self.log_test("Scan After Maintenance", False, f"- Error: {str(e)}")
+
+        # Event ids freed by archival must not be reused below the followers' cursor
+        if messages:
+            return self.log_test("Scan After Maintenance", True, f"- Received {len(messages)} messages")
+        else:
+            return self.log_test("Scan After Maintenance", False, "- No messages received")
+
     def test_error_handling(self):
         """Test various error scenarios"""
         print("\n🔍 Testing Error Handling...")
@@ -289,6 +461,7 @@ class LLMVulnerabilityScannerTester:
         
         # Basic API tests
         self.test_health_check()
+        self.test_health_endpoints()
         self.test_get_environments()
         self.test_get_models()
         self.test_get_probes()
@@ -297,13 +470,25 @@ class LLMVulnerabilityScannerTester:
         self.test_create_garak_scan()
         self.test_create_promptmap_scan()
         self.test_scan_validation()
+        self.test_cancel_scan()
+        self.test_scan_dedupe()
+        self.test_cancel_shared_scan()
+        self.test_scan_capacity()
         
         # Status check tests
         self.test_create_status_check()
         self.test_get_status_checks()
         
+        # Analytics tests
+        self.test_analytics()
+        self.test_export()
+        
         # WebSocket test
         self.test_websocket_connection()
+        self.test_scan_logs()
+        self.test_scan_trace()
+        self.test_maintenance()
+        self.test_scan_after_maintenance()
         
         # Error handling tests
         self.test_error_handling()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from "react";
+import React, { useState, useEffect, useLayoutEffect, useRef } from "react";
 import "./App.css";
 import { BrowserRouter, Routes, Route } from "react-router-dom";
 import axios from "axios";
@@ -6,6 +6,228 @@ import axios from "axios";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const LOG_ROW_HEIGHT = 20;
+const LOG_BUFFER_LINES = 5000;
+const LOG_HISTORY_PAGE = 500;
+const LOG_OVERSCAN = 20;
+
+// Windowed scan console: keeps about LOG_BUFFER_LINES lines in memory, renders
+// only the visible rows, applies WebSocket messages once per animation frame,
+// and pages older lines back in from the server when scrolled to the top.
+// While scrolled back it stops growing at the tail and reloads the latest page
+// once the user returns to the bottom.
+const LogViewer = ({ sessionId, onOpen, onClose, onError }) => {
+  const containerRef = useRef(null);
+  const linesRef = useRef([]);
+  const pendingRef = useRef([]);
+  const frameRef = useRef(null);
+  const followRef = useRef(true);
+  const hasOlderRef = useRef(false);
+  const gapRef = useRef(false);
+  const resyncingRef = useRef(false);
+  const loadingOlderRef = useRef(false);
+  const scrollAdjustRef = useRef(0);
+  const callbacksRef = useRef({ onOpen, onClose, onError });
+  const [, setVersion] = useState(0);
+  const [scrollTop, setScrollTop] = useState(0);
+  const [viewportHeight, setViewportHeight] = useState(400);
+
+  callbacksRef.current = { onOpen, onClose, onError };
+
+  const rerender = () => setVersion(version => version + 1);
+
+  const flushPending = () => {
+    frameRef.current = null;
+    if (gapRef.current) {
+      // Newer lines were dropped while scrolled back; they come back with the latest page on resync
+      if (!resyncingRef.current) {
+        pendingRef.current = [];
+      }
+      return;
+    }
+    let lines = linesRef.current.concat(pendingRef.current);
+    pendingRef.current = [];
+    const excess = lines.length - LOG_BUFFER_LINES;
+    if (excess > 0) {
+      if (followRef.current) {
+        lines = lines.slice(excess);
+        hasOlderRef.current = true;
+      } else {
+        // Keep the history the user scrolled back to read and drop the newest lines instead
+        lines = lines.slice(0, LOG_BUFFER_LINES);
+        gapRef.current = true;
+      }
+    }
+    linesRef.current = lines;
+    rerender();
+  };
+
+  const resync = async () => {
+    if (resyncingRef.current) {
+      return;
+    }
+    resyncingRef.current = true;
+    try {
+      const response = await axios.get(`${API}/scan/${sessionId}/logs`, { params: { limit: LOG_HISTORY_PAGE } });
+      const latest = response.data.lines;
+      const lastId = latest.length > 0 ? latest[latest.length - 1].id : 0;
+      linesRef.current = latest;
+      hasOlderRef.current = response.data.has_more;
+      // Lines received while the page was loading may already be part of it
+      pendingRef.current = pendingRef.current.filter(line => line.id === null || line.id > lastId);
+      gapRef.current = false;
+    } catch (err) {
+      callbacksRef.current.onError("Failed to load latest output: " + err.message);
+    } finally {
+      resyncingRef.current = false;
+    }
+    flushPending();
+  };
+
+  const loadOlder = async () => {
+    if (loadingOlderRef.current || !hasOlderRef.current) {
+      return;
+    }
+    loadingOlderRef.current = true;
+    try {
+      const params = { limit: LOG_HISTORY_PAGE };
+      if (linesRef.current.length > 0) {
+        params.before = linesRef.current[0].id;
+      }
+      const response = await axios.get(`${API}/scan/${sessionId}/logs`, { params });
+      const older = response.data.lines;
+      linesRef.current = older.concat(linesRef.current);
+      hasOlderRef.current = response.data.has_more;
+      scrollAdjustRef.current += older.length * LOG_ROW_HEIGHT;
+      rerender();
+    } catch (err) {
+      callbacksRef.current.onError("Failed to load earlier output: " + err.message);
+    } finally {
+      loadingOlderRef.current = false;
+    }
+  };
+
+  useEffect(() => {
+    let ws = null;
+    let cancelled = false;
+
+    const connect = async () => {
+      // Start from the latest page of stored output, then follow live from there
+      let after = 0;
+      try {
+        const response = await axios.get(`${API}/scan/${sessionId}/logs`, { params: { limit: LOG_HISTORY_PAGE } });
+        linesRef.current = response.data.lines;
+        hasOlderRef.current = response.data.has_more;
+        if (response.data.lines.length > 0) {
+          after = response.data.lines[response.data.lines.length - 1].id;
+        }
+        rerender();
+      } catch (err) {
+        linesRef.current = [];
+      }
+      if (cancelled) {
+        return;
+      }
+
+      const wsUrl = `${BACKEND_URL.replace('http', 'ws')}/api/ws/scan/${sessionId}?format=json&after=${after}`;
+      ws = new WebSocket(wsUrl);
+      ws.onopen = () => callbacksRef.current.onOpen();
+      ws.onmessage = (event) => {
+        try {
+          pendingRef.current.push(JSON.parse(event.data));
+        } catch (err) {
+          pendingRef.current.push({ id: null, text: event.data });
+        }
+        if (frameRef.current === null) {
+          frameRef.current = requestAnimationFrame(flushPending);
+        }
+      };
+      ws.onclose = () => callbacksRef.current.onClose();
+      ws.onerror = (error) => callbacksRef.current.onError("WebSocket error: " + error.message);
+    };
+
+    linesRef.current = [];
+    pendingRef.current = [];
+    followRef.current = true;
+    gapRef.current = false;
+    connect();
+
+    return () => {
+      cancelled = true;
+      if (frameRef.current !== null) {
+        cancelAnimationFrame(frameRef.current);
+        frameRef.current = null;
+      }
+      if (ws) {
+        ws.onopen = ws.onmessage = ws.onclose = ws.onerror = null;
+        ws.close();
+      }
+    };
+  }, [sessionId]);
+
+  useEffect(() => {
+    const measure = () => {
+      if (containerRef.current) {
+        setViewportHeight(containerRef.current.clientHeight);
+      }
+    };
+    measure();
+    window.addEventListener("resize", measure);
+    return () => window.removeEventListener("resize", measure);
+  }, []);
+
+  useLayoutEffect(() => {
+    const container = containerRef.current;
+    if (!container) {
+      return;
+    }
+    if (scrollAdjustRef.current) {
+      // Keep the same lines in view after older history is prepended
+      container.scrollTop += scrollAdjustRef.current;
+      scrollAdjustRef.current = 0;
+    } else if (followRef.current) {
+      container.scrollTop = container.scrollHeight;
+    }
+  });
+
+  const handleScroll = (event) => {
+    const container = event.currentTarget;
+    setScrollTop(container.scrollTop);
+    followRef.current = container.scrollTop + container.clientHeight >= container.scrollHeight - LOG_ROW_HEIGHT;
+    if (followRef.current && gapRef.current) {
+      resync();
+    }
+    if (container.scrollTop < LOG_ROW_HEIGHT * LOG_OVERSCAN) {
+      loadOlder();
+    }
+  };
+
+  const lines = linesRef.current;
+  const first = Math.max(0, Math.floor(scrollTop / LOG_ROW_HEIGHT) - LOG_OVERSCAN);
+  const last = Math.min(lines.length, Math.ceil((scrollTop + viewportHeight) / LOG_ROW_HEIGHT) + LOG_OVERSCAN);
+  const rows = [];
+  for (let index = first; index < last; index++) {
+    rows.push(
+      <div
+        key={lines[index].id ?? `line-${index}`}
+        className="terminal-row"
+        style={{ top: index * LOG_ROW_HEIGHT }}
+        title={lines[index].text}
+      >
+        {lines[index].text}
+      </div>
+    );
+  }
+
+  return (
+    <div className="terminal-output virtualized" ref={containerRef} onScroll={handleScroll}>
+      <div className="terminal-viewport" style={{ height: lines.length * LOG_ROW_HEIGHT }}>
+        {rows}
+      </div>
+    </div>
+  );
+};
+
 const ScanWizard = () => {
   const [currentStep, setCurrentStep] = useState(1);
   const [environments, setEnvironments] = useState([]);
@@ -18,22 +240,13 @@ const ScanWizard = () => {
   const [promptmapDirectory, setPromptmapDirectory] = useState("");
   const [scanSession, setScanSession] = useState(null);
   const [isScanning, setIsScanning] = useState(false);
-  const [scanOutput, setScanOutput] = useState([]);
   const [error, setError] = useState("");
   const [loading, setLoading] = useState(false);
-  const wsRef = useRef(null);
-  const outputRef = useRef(null);
 
   useEffect(() => {
     loadInitialData();
   }, []);
 
-  useEffect(() => {
-    if (outputRef.current) {
-      outputRef.current.scrollTop = outputRef.current.scrollHeight;
-    }
-  }, [scanOutput]);
-
   const loadInitialData = async () => {
     setLoading(true);
     try {
@@ -101,37 +314,18 @@ const ScanWizard = () => {
       const response = await axios.post(`${API}/scan`, scanData);
       setScanSession(response.data);
       setCurrentStep(4);
-      connectWebSocket(response.data.session_id);
     } catch (err) {
-      setError("Failed to start scan: " + err.message);
+      if (err.response && err.response.status === 429) {
+        const retryAfter = err.response.headers["retry-after"];
+        setError(`Scanner is at capacity: ${err.response.data.detail}. Try again in ${retryAfter} seconds.`);
+      } else {
+        setError("Failed to start scan: " + err.message);
+      }
     } finally {
       setLoading(false);
     }
   };
 
-  const connectWebSocket = (sessionId) => {
-    const wsUrl = `${BACKEND_URL.replace('http', 'ws')}/api/ws/scan/${sessionId}`;
-    wsRef.current = new WebSocket(wsUrl);
-
-    wsRef.current.onopen = () => {
-      setIsScanning(true);
-      setScanOutput([]);
-    };
-
-    wsRef.current.onmessage = (event) => {
-      setScanOutput(prev => [...prev, event.data]);
-    };
-
-    wsRef.current.onclose = () => {
-      setIsScanning(false);
-    };
-
-    wsRef.current.onerror = (error) => {
-      setError("WebSocket error: " + error.message);
-      setIsScanning(false);
-    };
-  };
-
   const nextStep = () => {
     if (currentStep < 4) {
       setCurrentStep(currentStep + 1);
@@ -153,11 +347,7 @@ const ScanWizard = () => {
     setPromptmapDirectory("");
     setScanSession(null);
     setIsScanning(false);
-    setScanOutput([]);
     setError("");
-    if (wsRef.current) {
-      wsRef.current.close();
-    }
   };
 
   const renderStep = () => {
@@ -292,6 +482,9 @@ const ScanWizard = () => {
                 {selectedTool === 'promptmap' && (
                   <p><strong>Directory:</strong> {promptmapDirectory}</p>
                 )}
+                {scanSession && scanSession.status === "attached" && (
+                  <p><strong>Shared:</strong> joined an identical scan already in progress</p>
+                )}
               </div>
               <div className="scan-status">
                 {isScanning ? (
@@ -306,13 +499,17 @@ const ScanWizard = () => {
                 )}
               </div>
             </div>
-            <div className="terminal-output" ref={outputRef}>
-              {scanOutput.map((line, index) => (
-                <div key={index} className="terminal-line">
-                  {line}
-                </div>
-              ))}
-            </div>
+            {scanSession && (
+              <LogViewer
+                sessionId={scanSession.session_id}
+                onOpen={() => setIsScanning(true)}
+                onClose={() => setIsScanning(false)}
+                onError={(message) => {
+                  setError(message);
+                  setIsScanning(false);
+                }}
+              />
+            )}
           </div>
         );
 